@@ -0,0 +1,75 @@
+"""Pick Argon2 parameters that verify in about `--target-ms` on this host.
+
+For each memory cost, raises the time cost until a verification takes
+longer than the target, then suggests the strongest combination that
+stayed within it. Run it on the production hardware.
+
+    python -m benchmarks.argon2_calibrate --target-ms 100
+"""
+
+import argparse
+import statistics
+import time
+
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+MEMORY_COSTS_KIB = (19_456, 32_768, 65_536, 131_072, 262_144)
+MAX_TIME_COST = 10
+SAMPLES = 5
+
+
+def verify_ms(hasher):
+    hashed = hasher.hash('calibration')
+    samples = []
+    for _ in range(SAMPLES):
+        start = time.perf_counter()
+        hasher.verify('calibration', hashed)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def calibrate(target_ms, parallelism):
+    best = None
+    for memory_cost in MEMORY_COSTS_KIB:
+        for time_cost in range(1, MAX_TIME_COST + 1):
+            elapsed = verify_ms(
+                Argon2Hasher(
+                    time_cost=time_cost,
+                    memory_cost=memory_cost,
+                    parallelism=parallelism,
+                )
+            )
+            print(
+                f'm={memory_cost:>7} t={time_cost:>2} p={parallelism}  '
+                f'{elapsed:8.1f}ms'
+            )
+            if elapsed > target_ms:
+                break
+            best = (memory_cost, time_cost)
+
+        # Even one pass over this much memory is too slow.
+        if time_cost == 1 and elapsed > target_ms:
+            break
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target-ms', type=float, default=100)
+    parser.add_argument('--parallelism', type=int, default=4)
+    args = parser.parse_args()
+
+    best = calibrate(args.target_ms, args.parallelism)
+    if best is None:
+        print('No parameters verify within the target; raise --target-ms.')
+        return
+
+    memory_cost, time_cost = best
+    print()
+    print(f'ARGON2_MEMORY_COST_KIB={memory_cost}')
+    print(f'ARGON2_TIME_COST={time_cost}')
+    print(f'ARGON2_PARALLELISM={args.parallelism}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Per-request cost of resolving the caller, by authentication mode.
+
+Times `get_reader` alone, as read endpoints resolve the caller, for a
+DB lookup on every request, a principal cache hit and a stateless
+token.
+
+    python -m benchmarks.auth_overhead
+"""
+
+import asyncio
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.utils import create_user, fresh_database
+from fastapi_zero import security
+from fastapi_zero.database import get_engine
+
+REQUESTS = 5_000
+
+
+async def timed(session, token, *, clear_principal):
+    samples = []
+    for _ in range(REQUESTS):
+        if clear_principal:
+            security.principal_cache.clear()
+        start = time.perf_counter()
+        await security.get_reader(session, token)
+        samples.append(time.perf_counter() - start)
+    return sum(samples) / len(samples) * 1e6
+
+
+async def main():
+    async with fresh_database():
+        user = await create_user()
+        token = security.create_access_token(security.token_claims(user))
+
+        async with AsyncSession(get_engine()) as session:
+            modes = (
+                ('database lookup', False, True),
+                ('principal cache', False, False),
+                ('stateless token', True, False),
+            )
+            for name, stateless, clear_principal in modes:
+                security.settings.STATELESS_TOKENS = stateless
+                micros = await timed(
+                    session, token, clear_principal=clear_principal
+                )
+                print(f'{name:<18} {micros:8.1f}us per request')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""Throughput of importing todos one by one against the bulk endpoints.
+
+The single-item endpoint is sampled with fewer todos; the rate is what
+matters.
+
+    python -m benchmarks.bulk_insert
+"""
+
+import asyncio
+import json
+import time
+
+from benchmarks.utils import client, create_user, fresh_database, login
+
+TODOS = 10_000
+SINGLE_ITEM_SAMPLE = 500
+
+
+def payload(count):
+    return [
+        {'title': f'todo {n}', 'description': 'imported', 'state': 'todo'}
+        for n in range(count)
+    ]
+
+
+def report(name, count, seconds):
+    print(f'{name:<22} {count:>6} todos  {count / seconds:10.0f} todos/s')
+
+
+async def main():
+    async with fresh_database(), client() as http:
+        user = await create_user()
+        headers = await login(http, user)
+
+        start = time.perf_counter()
+        for todo in payload(SINGLE_ITEM_SAMPLE):
+            await http.post('/todos/', headers=headers, json=todo)
+        report(
+            'POST /todos/',
+            SINGLE_ITEM_SAMPLE,
+            time.perf_counter() - start,
+        )
+
+        start = time.perf_counter()
+        await http.post('/todos/bulk', headers=headers, json=payload(TODOS))
+        report('POST /todos/bulk', TODOS, time.perf_counter() - start)
+
+        body = '\n'.join(json.dumps(todo) for todo in payload(TODOS))
+        start = time.perf_counter()
+        await http.post(
+            '/todos/bulk/ndjson',
+            headers={**headers, 'Content-Type': 'application/x-ndjson'},
+            content=body,
+        )
+        report('POST /todos/bulk/ndjson', TODOS, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""Peak server RSS while streaming `GET /todos/export` of growing sizes.
+
+Runs the app under uvicorn in a subprocess so the measured memory is the
+server's alone, seeds one user with more and more todos and samples the
+server's RSS while each export is downloaded. RSS is read from
+`/proc`, so this runs on Linux only.
+
+    python -m benchmarks.export_memory
+"""
+
+import asyncio
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from httpx import AsyncClient, HTTPError
+
+from benchmarks.pagination_depth import seed
+from benchmarks.utils import create_user, fresh_database, login
+
+SIZES = (1_000, 100_000, 1_000_000)
+PORT = 8765
+SAMPLE_SECONDS = 0.02
+
+
+async def wait_until_ready(http):
+    for _ in range(100):
+        try:
+            await http.get('/')
+            return
+        except HTTPError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError('uvicorn did not start')
+
+
+def rss(pid):
+    """Resident set size of `pid` in bytes."""
+    for line in (
+        Path(f'/proc/{pid}/status').read_text(encoding='ascii').splitlines()
+    ):
+        if line.startswith('VmRSS:'):
+            return int(line.split()[1]) * 1024
+    raise RuntimeError(f'no VmRSS for process {pid}')
+
+
+async def sample_rss(pid, peak):
+    while True:
+        peak[0] = max(peak[0], rss(pid))
+        await asyncio.sleep(SAMPLE_SECONDS)
+
+
+async def export(http, headers, pid):
+    peak = [rss(pid)]
+    sampler = asyncio.create_task(sample_rss(pid, peak))
+    received = 0
+
+    start = time.perf_counter()
+    async with http.stream('GET', '/todos/export', headers=headers) as r:
+        async for chunk in r.aiter_bytes():
+            received += len(chunk)
+    seconds = time.perf_counter() - start
+
+    sampler.cancel()
+    return peak[0], received, seconds
+
+
+async def main():
+    async with fresh_database():
+        user = await create_user()
+        server = subprocess.Popen([
+            sys.executable,
+            '-m',
+            'uvicorn',
+            'fastapi_zero.app:app',
+            '--port',
+            str(PORT),
+            '--log-level',
+            'warning',
+        ])
+
+        try:
+            async with AsyncClient(
+                base_url=f'http://127.0.0.1:{PORT}', timeout=None
+            ) as http:
+                await wait_until_ready(http)
+                headers = await login(http, user)
+
+                seeded = 0
+                for size in SIZES:
+                    await seed(user, size - seeded)
+                    seeded = size
+
+                    peak, received, seconds = await export(
+                        http, headers, server.pid
+                    )
+                    print(
+                        f'{size:>9} todos  peak RSS {peak / 2**20:7.1f}MiB  '
+                        f'{received / 2**20:7.1f}MiB in {seconds:6.2f}s'
+                    )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
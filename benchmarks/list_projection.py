@@ -0,0 +1,85 @@
+"""Latency and memory of 100-row list pages, ORM entities against columns.
+
+Runs many concurrent page loads, each one validating the page through
+`TodoList` like the endpoint does, and reports latency percentiles and
+the peak memory traced while the pages were alive.
+
+    python -m benchmarks.list_projection
+"""
+
+import asyncio
+import time
+import tracemalloc
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.utils import create_user, fresh_database, report
+from fastapi_zero.database import get_engine
+from fastapi_zero.models import Todo, TodoState
+from fastapi_zero.routers.todos import TODO_PUBLIC_COLUMNS
+from fastapi_zero.schemas import TodoList
+
+PAGE_SIZE = 100
+CONCURRENCY = 50
+ROUNDS = 10
+
+
+async def seed(user, count):
+    rows = [
+        {
+            'title': f'todo {n}',
+            'description': 'benchmark',
+            'state': TodoState.todo,
+            'user_id': user.id,
+        }
+        for n in range(count)
+    ]
+    async with AsyncSession(get_engine()) as session:
+        await session.execute(insert(Todo), rows)
+        await session.commit()
+
+
+async def load_entities(session, user_id):
+    query = select(Todo).where(Todo.user_id == user_id)
+    return (await session.scalars(query.limit(PAGE_SIZE))).all()
+
+
+async def load_columns(session, user_id):
+    query = select(*TODO_PUBLIC_COLUMNS).where(Todo.user_id == user_id)
+    return (await session.execute(query.limit(PAGE_SIZE))).all()
+
+
+async def page(load, user_id, samples):
+    start = time.perf_counter()
+    async with AsyncSession(get_engine()) as session:
+        todos = await load(session, user_id)
+        TodoList.model_validate({'todos': todos}, from_attributes=True)
+    samples.append(time.perf_counter() - start)
+
+
+async def run(name, load, user_id):
+    samples = []
+    tracemalloc.start()
+    for _ in range(ROUNDS):
+        await asyncio.gather(
+            *(page(load, user_id, samples) for _ in range(CONCURRENCY))
+        )
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    report(name, samples)
+    print(f'{"":<28} peak={peak / 1024 / 1024:.1f}MiB')
+
+
+async def main():
+    async with fresh_database():
+        user = await create_user()
+        await seed(user, PAGE_SIZE)
+
+        await run('ORM entities', load_entities, user.id)
+        await run('column projection', load_columns, user.id)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""Impact of concurrent logins on `GET /todos/` latency.
+
+Runs a stream of `GET /todos/` requests alone, then again while a login
+storm runs alongside, and prints p50/p99 for both. Every login must
+succeed so that each one really costs an Argon2 verification: the
+storm spreads over one account per login and lifts the per-address
+and concurrent-verification limits, since all requests come from the
+same client here. It fails if any login is turned away.
+
+    python -m benchmarks.login_concurrency
+"""
+
+import asyncio
+import sys
+import time
+from collections import Counter
+from http import HTTPStatus
+
+from benchmarks.utils import (
+    PASSWORD,
+    client,
+    create_user,
+    fresh_database,
+    login,
+    report,
+)
+from fastapi_zero.routers import auth
+
+READERS = 20
+READS_PER_READER = 25
+# Stays within the hashing pool's workers + queue so none are shed.
+LOGINS = 32
+
+
+async def timed_reads(http, headers):
+    samples = []
+    for _ in range(READS_PER_READER):
+        start = time.perf_counter()
+        await http.get('/todos/', headers=headers)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def read_phase(http, headers):
+    results = await asyncio.gather(
+        *(timed_reads(http, headers) for _ in range(READERS))
+    )
+    return [sample for samples in results for sample in samples]
+
+
+async def login_storm(http, users):
+    responses = await asyncio.gather(
+        *(
+            http.post(
+                '/auth/token',
+                data={'username': user.email, 'password': PASSWORD},
+            )
+            for user in users
+        )
+    )
+    return Counter(response.status_code for response in responses)
+
+
+def lift_login_limits():
+    auth.login_ip_bucket.burst = LOGINS
+    auth.login_ip_bucket.clear()
+    auth.login_verifications.limit = LOGINS
+
+
+async def main():
+    async with fresh_database(), client() as http:
+        user = await create_user()
+        headers = await login(http, user)
+        users = [await create_user(f'login{i}') for i in range(LOGINS)]
+        lift_login_limits()
+
+        report('GET /todos/ alone', await read_phase(http, headers))
+
+        reads, statuses = await asyncio.gather(
+            read_phase(http, headers), login_storm(http, users)
+        )
+        report('GET /todos/ during logins', reads)
+        print(f'login statuses: {dict(sorted(statuses.items()))}')
+
+        if set(statuses) != {HTTPStatus.OK}:
+            sys.exit('some logins were rejected; results are not comparable')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
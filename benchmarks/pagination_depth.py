@@ -0,0 +1,68 @@
+"""Latency of deep `GET /todos/` pages, offset mode against cursor mode.
+
+Seeds one user with 1000 pages of todos and reads the page at several
+depths with both modes.
+
+    python -m benchmarks.pagination_depth
+"""
+
+import asyncio
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.utils import client, create_user, fresh_database, login
+from fastapi_zero.database import get_engine
+from fastapi_zero.models import Todo, TodoState
+from fastapi_zero.pagination import encode_cursor
+
+PAGE_SIZE = 100
+DEPTHS = (1, 10, 100, 1000)
+REPEAT = 20
+
+
+async def seed(user, count):
+    rows = [
+        {
+            'title': f'todo {n}',
+            'description': 'benchmark',
+            'state': TodoState.todo,
+            'user_id': user.id,
+        }
+        for n in range(count)
+    ]
+    async with AsyncSession(get_engine()) as session:
+        for start in range(0, count, 10_000):
+            await session.execute(insert(Todo), rows[start : start + 10_000])
+        await session.commit()
+
+
+async def timed(http, url, headers):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        await http.get(url, headers=headers)
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+async def main():
+    async with fresh_database(), client() as http:
+        user = await create_user()
+        await seed(user, max(DEPTHS) * PAGE_SIZE)
+        headers = await login(http, user)
+
+        for depth in DEPTHS:
+            skipped = (depth - 1) * PAGE_SIZE
+            offset_ms = await timed(http, f'/todos/?offset={skipped}', headers)
+            cursor_url = '/todos/'
+            if skipped:
+                cursor_url += f'?cursor={encode_cursor(skipped)}'
+            cursor_ms = await timed(http, cursor_url, headers)
+            print(
+                f'page {depth:>5}: offset {offset_ms:8.2f}ms  '
+                f'cursor {cursor_ms:8.2f}ms'
+            )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
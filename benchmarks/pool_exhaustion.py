@@ -0,0 +1,61 @@
+"""Connection pool behaviour under bursts.
+
+Fires bursts of concurrent sessions that each hold a connection for a
+short query against a deliberately small pool, and prints how many timed
+out plus the pool stats. Needs a PostgreSQL `DATABASE_URL`.
+
+    python -m benchmarks.pool_exhaustion
+"""
+
+import asyncio
+import time
+
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from fastapi_zero.database import engine_options
+from fastapi_zero.settings import get_settings
+
+BURSTS = (5, 20, 50, 100)
+HOLD_SECONDS = 0.05
+
+
+async def hold_connection(engine):
+    start = time.perf_counter()
+    try:
+        async with AsyncSession(engine) as session:
+            await session.execute(text(f'SELECT pg_sleep({HOLD_SECONDS})'))
+    except exc.TimeoutError:
+        return None
+    return time.perf_counter() - start
+
+
+async def main():
+    settings = get_settings().model_copy(
+        update={
+            'DB_POOL_SIZE': 5,
+            'DB_MAX_OVERFLOW': 5,
+            'DB_POOL_TIMEOUT_SECONDS': 0.5,
+        }
+    )
+    engine = create_async_engine(
+        settings.DATABASE_URL, **engine_options(settings)
+    )
+
+    for burst in BURSTS:
+        results = await asyncio.gather(
+            *(hold_connection(engine) for _ in range(burst))
+        )
+        served = [result for result in results if result is not None]
+        print(
+            f'burst {burst:>4}: served {len(served):>4} '
+            f'timed out {burst - len(served):>4} '
+            f'slowest {max(served) * 1000:8.2f}ms'
+        )
+        print(f'           pool {engine.pool.stats()}')
+
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+"""Serialization cost of a 100-todo page, default path against orjson.
+
+The default path mirrors what FastAPI does with `response_model=TodoList`:
+validate the ORM objects, dump them in JSON mode and encode with the
+stdlib. The fast path is `fast_list_response`.
+
+    python -m benchmarks.serialization
+"""
+
+import json
+import timeit
+from datetime import datetime
+
+from fastapi_zero.models import Todo, TodoState
+from fastapi_zero.responses import fast_list_response
+from fastapi_zero.schemas import TodoList, TodoPublic
+
+PAGE_SIZE = 100
+NUMBER = 2_000
+
+
+def make_page():
+    todos = []
+    for n in range(PAGE_SIZE):
+        todo = Todo(
+            title=f'todo {n}',
+            description='a reasonably sized description ' * 3,
+            state=TodoState.doing,
+            user_id=1,
+        )
+        todo.id = n + 1
+        todo.created_at = todo.updated_at = datetime(2024, 1, 1, 12, 30)
+        todos.append(todo)
+    return todos
+
+
+def default_path(todos):
+    page = TodoList.model_validate(
+        {'todos': todos, 'next_cursor': None}, from_attributes=True
+    )
+    return json.dumps(page.model_dump(mode='json')).encode()
+
+
+def fast_path(todos):
+    return fast_list_response('todos', todos, TodoPublic, next_cursor=None)
+
+
+def main():
+    todos = make_page()
+    assert json.loads(default_path(todos)) == json.loads(fast_path(todos).body)
+
+    for name, func in (('default', default_path), ('orjson', fast_path)):
+        seconds = timeit.timeit(lambda: func(todos), number=NUMBER)
+        print(f'{name:<8} {seconds / NUMBER * 1e6:8.1f}us per page')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""`GET /todos/` text filters on a large todo table.
+
+Seeds a million todos over a few hundred users and compares the substring
+`title=` filter with the ranked `q=` search for one user.
+
+    python -m benchmarks.todo_search
+"""
+
+import asyncio
+import random
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.utils import client, create_user, fresh_database, login
+from fastapi_zero.database import get_engine
+from fastapi_zero.models import Todo, TodoState, User
+
+ROWS = 1_000_000
+USERS = 500
+REPEAT = 20
+WORDS = (
+    'buy milk call mom pay rent book flight fix bike water plants '
+    'renew passport clean garage write report plan trip to rome'
+).split()
+
+
+def sentence(words):
+    return ' '.join(random.sample(WORDS, words))
+
+
+async def seed(user):
+    async with AsyncSession(get_engine()) as session:
+        await session.execute(
+            insert(User),
+            [
+                {
+                    'username': f'user{n}',
+                    'email': f'user{n}@bench.com',
+                    'password': '-',
+                }
+                for n in range(USERS)
+            ],
+        )
+        user_ids = [user.id, *range(user.id + 1, user.id + USERS + 1)]
+        for _ in range(0, ROWS, 10_000):
+            await session.execute(
+                insert(Todo),
+                [
+                    {
+                        'title': sentence(3),
+                        'description': sentence(8),
+                        'state': TodoState.todo,
+                        'user_id': random.choice(user_ids),
+                    }
+                    for _ in range(10_000)
+                ],
+            )
+        await session.commit()
+
+
+async def timed(http, url, headers):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        await http.get(url, headers=headers)
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+async def main():
+    async with fresh_database(), client() as http:
+        user = await create_user()
+        await seed(user)
+        headers = await login(http, user)
+
+        for url in (
+            '/todos/?title=rome',
+            '/todos/?description=passport',
+            '/todos/?q=rome',
+            '/todos/?q=renew passport',
+        ):
+            print(f'{url:<34} {await timed(http, url, headers):8.2f}ms')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
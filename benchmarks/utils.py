@@ -0,0 +1,60 @@
+import statistics
+from contextlib import asynccontextmanager
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastapi_zero.app import app
+from fastapi_zero.database import get_engine
+from fastapi_zero.models import User, table_registry
+from fastapi_zero.security import get_password_hash
+
+PASSWORD = 'benchmark'
+
+
+def percentile(samples, pct):
+    return statistics.quantiles(samples, n=100)[pct - 1]
+
+
+def report(name, samples):
+    print(
+        f'{name:<28} n={len(samples):<6} '
+        f'p50={percentile(samples, 50) * 1000:8.2f}ms '
+        f'p99={percentile(samples, 99) * 1000:8.2f}ms'
+    )
+
+
+@asynccontextmanager
+async def fresh_database():
+    """Recreate the schema on the configured DATABASE_URL."""
+    async with get_engine().begin() as conn:
+        await conn.run_sync(table_registry.metadata.drop_all)
+        await conn.run_sync(table_registry.metadata.create_all)
+
+    try:
+        yield
+    finally:
+        await get_engine().dispose()
+
+
+async def create_user(username='bench'):
+    async with AsyncSession(get_engine(), expire_on_commit=False) as session:
+        user = User(
+            username=username,
+            email=f'{username}@bench.com',
+            password=get_password_hash(PASSWORD),
+        )
+        session.add(user)
+        await session.commit()
+        return user
+
+
+def client():
+    return AsyncClient(transport=ASGITransport(app), base_url='http://bench')
+
+
+async def login(client, user):
+    response = await client.post(
+        '/auth/token', data={'username': user.email, 'password': PASSWORD}
+    )
+    return {'Authorization': f'Bearer {response.json()["access_token"]}'}
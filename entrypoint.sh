@@ -3,5 +3,9 @@
 # Executa as migrações do banco de dados
 poetry run alembic upgrade head
 
-# Inicia a aplicação
-poetry run uvicorn --host 0.0.0.0 --port 8000 fastapi_zero.app:app
+# Inicia a aplicação. Atrás do balanceador, o IP do cliente vem do
+# X-Forwarded-For enviado pelos endereços em FORWARDED_ALLOW_IPS; sem
+# isso todos os clientes dividiriam o limite de logins do balanceador.
+poetry run uvicorn --host 0.0.0.0 --port 8000 \
+    --forwarded-allow-ips "${FORWARDED_ALLOW_IPS:-127.0.0.1}" \
+    fastapi_zero.app:app
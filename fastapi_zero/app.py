@@ -1,12 +1,43 @@
+from contextlib import asynccontextmanager
 from http import HTTPStatus
+from time import perf_counter
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.responses import HTMLResponse
 
+from fastapi_zero import metrics
+from fastapi_zero.database import pool_stats
+from fastapi_zero.events import broker
+from fastapi_zero.instrumentation import log_request, track_queries
 from fastapi_zero.routers import auth, todos, users
 from fastapi_zero.schemas import Message
+from fastapi_zero.security import principal_cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await broker.close()
+    metrics.mark_process_dead()
+
+
+app = FastAPI(title='Rápido API', lifespan=lifespan)
+
+
+@app.middleware('http')
+async def instrument_requests(request: Request, call_next):
+    start = perf_counter()
+    with track_queries() as stats, metrics.track_in_flight():
+        response = await call_next(request)
+
+    metrics.observe_request(request, response, perf_counter() - start)
+    metrics.set_pool_stats(pool_stats())
+    metrics.set_stats(metrics.PRINCIPAL_CACHE, principal_cache.stats())
+    response.headers['Server-Timing'] = stats.server_timing()
+    log_request(request, response, stats)
+
+    return response
 
-app = FastAPI(title='Rápido API')
 
 app.include_router(users.router)
 app.include_router(auth.router)
@@ -18,6 +49,11 @@ async def read_root():
     return {'message': 'Olá, Mundo!'}
 
 
+@app.get('/metrics', include_in_schema=False)
+async def read_metrics():
+    return Response(metrics.render(), media_type=metrics.content_type)
+
+
 @app.get('/exercicio-html', response_class=HTMLResponse)
 async def exercicio_aula_02():
     return """
@@ -0,0 +1,69 @@
+"""Conditional GET helpers: validators and `304 Not Modified` responses."""
+
+from datetime import UTC, datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import blake2b
+from http import HTTPStatus
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag for a representation derived from `parts`.
+
+    Weak because the same data may be encoded slightly differently by the
+    default and the fast JSON paths.
+    """
+    digest = blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def validators(etag: str, last_modified: datetime | None) -> dict[str, str]:
+    headers = {'ETag': etag}
+    if last_modified is not None:
+        headers['Last-Modified'] = format_datetime(
+            _as_utc(last_modified), usegmt=True
+        )
+    return headers
+
+
+def is_fresh(
+    request: Request, etag: str, last_modified: datetime | None
+) -> bool:
+    """Whether the client's cached copy is still current.
+
+    `If-None-Match` wins over `If-Modified-Since` when both are sent, and
+    tags are compared weakly as RFC 9110 requires for GET.
+    """
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = {_opaque(tag) for tag in if_none_match.split(',')}
+        return '*' in tags or _opaque(etag) in tags
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is None or last_modified is None:
+        return False
+
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        return False
+
+    return _as_utc(last_modified).replace(microsecond=0) <= since
+
+
+def not_modified(headers: dict[str, str]) -> Response:
+    return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+
+
+def _opaque(tag: str) -> str:
+    return tag.strip().removeprefix('W/')
+
+
+def _as_utc(moment: datetime) -> datetime:
+    # Timestamps are stored without a time zone, in UTC.
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=UTC)
+    return moment.astimezone(UTC)
@@ -0,0 +1,141 @@
+"""Per-user counters maintained by the todo write handlers.
+
+`todo_counters` holds how many todos each user has in each state, so
+`GET /todos/stats` reads at most one row per state. Writers apply their
+deltas in the same transaction as the change; `repair_todo_counts`
+recounts from `todos` in case they ever drift:
+
+    python -m fastapi_zero.counters
+"""
+
+import asyncio
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastapi_zero.database import get_engine
+from fastapi_zero.models import Todo, TodoCounter, TodoState, User
+
+
+async def bump_todos_version(session, user_id: int):
+    """Record a write to the user's todos in the caller's transaction.
+
+    The increment is computed by the database, and the UPDATE holds the
+    user's row lock until commit, so concurrent writers queue up instead
+    of losing increments.
+    """
+    await session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            todos_version=User.todos_version + 1,
+            todos_updated_at=func.now(),
+            # Keep the profile's own `onupdate` timestamp untouched.
+            updated_at=User.updated_at,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def todos_version(session, user_id: int):
+    """The user's `(todos_version, todos_updated_at)`, by primary key."""
+    return (
+        await session.execute(
+            select(User.todos_version, User.todos_updated_at).where(
+                User.id == user_id
+            )
+        )
+    ).one()
+
+
+async def adjust_todo_counts(
+    session, user_id: int, deltas: dict[TodoState, int]
+):
+    """Add `deltas` to the user's per-state counts with one upsert.
+
+    Call it after `bump_todos_version`: holding the user's row lock
+    serializes their writers, so counter rows are never locked in
+    conflicting orders.
+    """
+    rows = [
+        {'user_id': user_id, 'state': state, 'count': delta}
+        for state, delta in sorted(deltas.items())
+        if delta
+    ]
+    if not rows:
+        return
+
+    dialect = session.bind.dialect.name
+    insert = (postgresql if dialect == 'postgresql' else sqlite).insert
+    statement = insert(TodoCounter).values(rows)
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[TodoCounter.user_id, TodoCounter.state],
+            set_={'count': TodoCounter.count + statement.excluded.count},
+        )
+    )
+
+
+async def todo_counts(session, user_id: int) -> dict[TodoState, int]:
+    """The user's stored count for every state, zero when missing."""
+    counts = dict(
+        (
+            await session.execute(
+                select(TodoCounter.state, TodoCounter.count).where(
+                    TodoCounter.user_id == user_id
+                )
+            )
+        ).all()
+    )
+    return {state: counts.get(state, 0) for state in TodoState}
+
+
+async def repair_todo_counts(session, user_id: int) -> int:
+    """Recount the user's todos and fix drifted counters.
+
+    Takes the user's row lock like every writer, so no write lands
+    between counting and fixing. Returns how many states were off.
+    """
+    await session.execute(
+        select(User.id).where(User.id == user_id).with_for_update()
+    )
+    actual = dict(
+        (
+            await session.execute(
+                select(Todo.state, func.count())
+                .where(Todo.user_id == user_id)
+                .group_by(Todo.state)
+            )
+        ).all()
+    )
+    stored = await todo_counts(session, user_id)
+
+    deltas = {
+        state: actual.get(state, 0) - count
+        for state, count in stored.items()
+        if actual.get(state, 0) != count
+    }
+    await adjust_todo_counts(session, user_id, deltas)
+    return len(deltas)
+
+
+async def repair_all_todo_counts(engine) -> int:
+    """Run `repair_todo_counts` for every user, one transaction each."""
+    async with AsyncSession(engine) as session:
+        user_ids = (await session.scalars(select(User.id))).all()
+
+    repaired = 0
+    for user_id in user_ids:
+        async with AsyncSession(engine) as session, session.begin():
+            repaired += await repair_todo_counts(session, user_id)
+    return repaired
+
+
+async def main():
+    repaired = await repair_all_todo_counts(get_engine())
+    print(f'Repaired {repaired} todo counters')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,10 +1,247 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from contextlib import asynccontextmanager
+from functools import cache
+from itertools import cycle
+from time import perf_counter
 
-from fastapi_zero.settings import Settings
+from sqlalchemy import exc, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-engine = create_async_engine(Settings().DATABASE_URL)
+from fastapi_zero.cache import TTLCache
+from fastapi_zero.metrics import (
+    DB_POOL_CHECKOUTS,
+    DB_POOL_OVERFLOW_CHECKOUTS,
+    DB_POOL_TIMEOUTS,
+    DB_POOL_WAIT_SECONDS,
+)
+from fastapi_zero.settings import Settings, get_settings
 
+# `Session.info` flag marking sessions bound to a replica.
+REPLICA = 'replica'
 
-async def get_session():  # pragma: no cover
-    async with AsyncSession(engine, expire_on_commit=False) as session:
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long callers wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def connect(self):
+        start = perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            waited = perf_counter() - start
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            DB_POOL_WAIT_SECONDS.inc(waited)
+
+        self.checkouts += 1
+        DB_POOL_CHECKOUTS.inc()
+        if self.checkedout() > self.size():
+            self.overflow_checkouts += 1
+            DB_POOL_OVERFLOW_CHECKOUTS.inc()
+
+        return connection
+
+    def stats(self) -> dict[str, float]:
+        return {
+            'size': self.size(),
+            'checked_out': self.checkedout(),
+            'overflow': max(self.overflow(), 0),
+            'checkouts': self.checkouts,
+            'overflow_checkouts': self.overflow_checkouts,
+            'timeouts': self.timeouts,
+            'wait_seconds_total': self.wait_seconds_total,
+            'wait_seconds_max': self.wait_seconds_max,
+        }
+
+
+def engine_options(settings: Settings, url: str | None = None) -> dict:
+    """Pool and driver options for `create_async_engine`.
+
+    Only PostgreSQL gets a tuned queue pool; SQLite keeps the pool
+    SQLAlchemy picks for it. `url` defaults to `DATABASE_URL`.
+    """
+    url = url or settings.DATABASE_URL
+    if make_url(url).get_backend_name() != 'postgresql':
+        return {}
+
+    connect_args = {'prepare_threshold': settings.DB_PREPARE_THRESHOLD}
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        connect_args['options'] = (
+            f'-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}'
+        )
+
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT_SECONDS,
+        'pool_recycle': settings.DB_POOL_RECYCLE_SECONDS,
+        'pool_pre_ping': settings.DB_POOL_PRE_PING,
+        'connect_args': connect_args,
+    }
+
+
+class MemoryWriteLog:
+    """Per-process record of users whose data was just written.
+
+    Other workers never see these writes, so with several workers a
+    user's next read may land on a lagging replica.
+    """
+
+    shared = False
+
+    def __init__(self, ttl: float):
+        self._writers = TTLCache(maxsize=10_000, ttl=ttl)
+
+    async def mark(self, user_id: int) -> None:
+        self._writers.set(user_id, True)
+
+    async def wrote_recently(self, user_id: int) -> bool:
+        return self._writers.get(user_id, False)
+
+    def clear(self):
+        self._writers.clear()
+
+
+class RedisWriteLog:
+    """Record of recent writers on a Redis-protocol server, for all workers."""
+
+    shared = True
+
+    def __init__(self, client, ttl: float):
+        self.client = client
+        self._ttl_ms = int(ttl * 1000)
+
+    async def mark(self, user_id: int) -> None:
+        await self.client.set(f'wrote:{user_id}', 1, px=self._ttl_ms)
+
+    async def wrote_recently(self, user_id: int) -> bool:
+        return bool(await self.client.exists(f'wrote:{user_id}'))
+
+
+class ReplicaRouter:
+    """Picks the engine serving read-only sessions.
+
+    Replicas are used round-robin. A user whose data was just written
+    reads from the primary while `writes` remembers it, long enough for
+    the replicas to catch up, so they always see their own writes.
+    """
+
+    def __init__(self, engines: list, writes: MemoryWriteLog | RedisWriteLog):
+        self.engines = engines
+        self.writes = writes
+        self._next = cycle(engines)
+
+    async def pick(self, user_id: int | None):
+        """Return a replica engine for `user_id`, or None for the primary.
+
+        Anonymous readers (`user_id` None) always get a replica.
+        """
+        if not self.engines or await self.wrote_recently(user_id):
+            return None
+        return next(self._next)
+
+    async def mark_write(self, user_id: int):
+        """Record a committed write to `user_id`'s data."""
+        if self.engines:
+            await self.writes.mark(user_id)
+
+    async def wrote_recently(self, user_id: int | None) -> bool:
+        return user_id is not None and await self.writes.wrote_recently(
+            user_id
+        )
+
+
+def create_write_log(settings: Settings) -> MemoryWriteLog | RedisWriteLog:
+    if settings.DB_REPLICA_STICKY_BACKEND == 'redis':
+        # Imported only when configured, as for the response cache.
+        from redis.asyncio import Redis  # noqa: PLC0415
+
+        return RedisWriteLog(
+            Redis.from_url(settings.REDIS_URL),
+            ttl=settings.DB_REPLICA_STICKY_SECONDS,
+        )
+    return MemoryWriteLog(ttl=settings.DB_REPLICA_STICKY_SECONDS)
+
+
+settings = get_settings()
+
+
+# Engines are created on first use: creating one imports its driver, which
+# would otherwise slow down importing the app.
+@cache
+def get_engine() -> AsyncEngine:
+    return create_async_engine(
+        settings.DATABASE_URL, **engine_options(settings)
+    )
+
+
+@cache
+def get_replicas() -> ReplicaRouter:
+    return ReplicaRouter(
+        [
+            create_async_engine(url, **engine_options(settings, url))
+            for url in settings.DATABASE_REPLICA_URLS
+        ],
+        create_write_log(settings),
+    )
+
+
+def pool_stats() -> dict[str, float]:
+    engine = get_engine()
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        return engine.pool.stats()
+    return {}
+
+
+async def get_session():
+    async with AsyncSession(get_engine(), expire_on_commit=False) as session:
         yield session
+
+
+@asynccontextmanager
+async def read_session(session: AsyncSession, user_id: int | None):
+    """A session for `user_id`'s reads, on a replica when one is set up.
+
+    Without replicas, or right after a write to the user's data, it is
+    the request's primary `session`.
+    """
+    replica = await get_replicas().pick(user_id)
+    if replica is None:
+        yield session
+        return
+
+    async with AsyncSession(replica, expire_on_commit=False) as reads:
+        reads.info[REPLICA] = True
+        yield reads
+
+
+async def may_be_stale(session: AsyncSession, user_id: int) -> bool:
+    """Whether `session` reads a replica that may lag `user_id`'s writes.
+
+    Responses read that way must not be stored in `response_cache`: they
+    would outlive the lag under the generation the write started. A
+    per-process write log can't rule out writes made by other workers,
+    so then no replica read is stored.
+    """
+    if not session.info.get(REPLICA):
+        return False
+
+    replicas = get_replicas()
+    return not replicas.writes.shared or await replicas.wrote_recently(user_id)
@@ -0,0 +1,154 @@
+"""Todo change feed.
+
+Write handlers `publish` changes inside their transaction and they are
+delivered only if it commits. Each worker fans events out to its local
+subscribers from one `TodoBroker`:
+
+- `memory`: events are delivered to this worker's subscribers when the
+  session commits. Fine for SQLite, tests and single-worker deployments.
+- `postgres`: events are sent with `NOTIFY` as part of the transaction
+  and every worker receives them on one shared `LISTEN` connection.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager, suppress
+
+import orjson
+from sqlalchemy import event, func, make_url, select
+from sqlalchemy.orm import Session
+
+from fastapi_zero.settings import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+CHANNEL = 'todo_events'
+# NOTIFY payloads are capped at 8000 bytes; larger changes are sent
+# without ids and subscribers refetch.
+MAX_EVENT_IDS = 500
+# Backoff between attempts to reconnect the LISTEN connection.
+LISTEN_RETRY_SECONDS = 1
+LISTEN_RETRY_MAX_SECONDS = 30
+
+
+class TodoBroker:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+        self._listener: asyncio.Task | None = None
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int):
+        """Yield a queue receiving the user's events until exit."""
+        if settings.EVENTS_BACKEND == 'postgres':
+            self._ensure_listener()
+
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[user_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[user_id].discard(queue)
+            if not self._subscribers[user_id]:
+                del self._subscribers[user_id]
+
+    def dispatch(self, message: dict):
+        todo_event = {'type': message['type'], 'ids': message['ids']}
+
+        for queue in self._subscribers.get(message['user_id'], ()):
+            try:
+                queue.put_nowait(todo_event)
+            except asyncio.QueueFull:
+                # A subscriber that fell behind gets one `resync` in
+                # place of everything it missed.
+                self._resync(queue)
+
+    def resync_all(self):
+        """Tell every subscriber to refetch, e.g. after missed events."""
+        for queues in self._subscribers.values():
+            for queue in queues:
+                self._resync(queue)
+
+    @staticmethod
+    def _resync(queue: asyncio.Queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait({'type': 'resync', 'ids': None})
+
+    def _ensure_listener(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        # Only the postgres backend needs the driver here; importing it
+        # lazily keeps it off the startup path.
+        import psycopg  # noqa: PLC0415
+
+        url = make_url(settings.DATABASE_URL).set(drivername='postgresql')
+        delay = LISTEN_RETRY_SECONDS
+        reconnecting = False
+
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    url.render_as_string(hide_password=False), autocommit=True
+                ) as connection:
+                    delay = LISTEN_RETRY_SECONDS
+                    await self._receive(connection, resync=reconnecting)
+            except (psycopg.Error, OSError, ValueError):
+                logger.exception('todo event listener disconnected')
+
+            reconnecting = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LISTEN_RETRY_MAX_SECONDS)
+
+    async def _receive(self, connection, *, resync: bool):
+        await connection.execute(f'LISTEN {CHANNEL}')
+        if resync:
+            # Events sent while disconnected are lost.
+            self.resync_all()
+
+        async for notify in connection.notifies():
+            self.dispatch(orjson.loads(notify.payload))
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
+
+
+broker = TodoBroker(queue_size=settings.EVENTS_QUEUE_SIZE)
+
+
+async def publish(session, user_id: int, kind: str, ids: list[int]):
+    """Queue a change event, delivered once `session` commits."""
+    message = {
+        'user_id': user_id,
+        'type': kind,
+        'ids': ids if len(ids) <= MAX_EVENT_IDS else None,
+    }
+
+    if (
+        settings.EVENTS_BACKEND == 'postgres'
+        and session.bind.dialect.name == 'postgresql'
+    ):
+        await session.execute(
+            select(func.pg_notify(CHANNEL, orjson.dumps(message).decode()))
+        )
+    else:
+        session.sync_session.info.setdefault(CHANNEL, []).append(message)
+
+
+@event.listens_for(Session, 'after_commit')
+def _deliver_events(session):
+    for message in session.info.pop(CHANNEL, ()):
+        broker.dispatch(message)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_events(session, previous_transaction):
+    session.info.pop(CHANNEL, None)
@@ -0,0 +1,83 @@
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from fastapi_zero.settings import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    slowest_seconds: float = 0.0
+    slowest_statement: str | None = None
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+    def server_timing(self) -> str:
+        return (
+            f'db;dur={self.total_seconds * 1000:.2f};'
+            f'desc="{self.count} queries", '
+            f'db-slowest;dur={self.slowest_seconds * 1000:.2f}'
+        )
+
+
+_current_stats: ContextVar[QueryStats | None] = ContextVar(
+    'query_stats', default=None
+)
+
+
+@contextmanager
+def track_queries():
+    """Collect stats for every statement run in the current context."""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@event.listens_for(Engine, 'before_cursor_execute', named=True)
+def _start_timer(context, **kw):
+    context.query_started_at = perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute', named=True)
+def _record_query(statement, context, **kw):
+    elapsed = perf_counter() - context.query_started_at
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+    if elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        logger.warning('slow query (%.2fms): %s', elapsed * 1000, statement)
+
+
+def log_request(request, response, stats: QueryStats):
+    logger.info(
+        json.dumps({
+            'method': request.method,
+            'path': request.url.path,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.total_seconds * 1000, 2),
+            'slowest_ms': round(stats.slowest_seconds * 1000, 2),
+            'slowest_statement': stats.slowest_statement,
+        })
+    )
@@ -0,0 +1,129 @@
+"""Prometheus metrics.
+
+With `PROMETHEUS_MULTIPROC_DIR` set (one shared directory for all uvicorn
+workers) every worker writes its samples to memory-mapped files and
+`/metrics` aggregates them, so any worker can answer a scrape.
+"""
+
+import os
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route template.',
+    ['method', 'route', 'status'],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight',
+    'Requests currently being served.',
+    multiprocess_mode='livesum',
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    'password_hash_duration_seconds',
+    'Time spent hashing or verifying passwords.',
+    ['operation'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+JWT_DECODE_FAILURES = Counter(
+    'jwt_decode_failures_total',
+    'Bearer tokens rejected while resolving the current user.',
+    ['reason'],
+)
+DB_POOL = Gauge(
+    'db_pool',
+    'Connection pool state of each live worker.',
+    ['stat'],
+    multiprocess_mode='livesum',
+)
+DB_POOL_WAIT_SECONDS_MAX = Gauge(
+    'db_pool_wait_seconds_max',
+    'Longest wait for a pooled connection in any worker.',
+    multiprocess_mode='max',
+)
+# Running totals are counters, incremented on every checkout, so they
+# survive worker restarts and work with `rate()`.
+DB_POOL_CHECKOUTS = Counter(
+    'db_pool_checkouts', 'Connections handed out by the database pools.'
+)
+DB_POOL_OVERFLOW_CHECKOUTS = Counter(
+    'db_pool_overflow_checkouts',
+    'Checkouts served by connections beyond the pool size.',
+)
+DB_POOL_TIMEOUTS = Counter(
+    'db_pool_timeouts', 'Checkouts that gave up waiting for a connection.'
+)
+DB_POOL_WAIT_SECONDS = Counter(
+    'db_pool_wait_seconds', 'Time spent waiting for pooled connections.'
+)
+# Stats of `InstrumentedQueuePool.stats` exported as `db_pool` gauges.
+POOL_STATE = ('size', 'checked_out', 'overflow')
+PRINCIPAL_CACHE = Gauge(
+    'principal_cache',
+    'Authenticated principal cache statistics of each live worker.',
+    ['stat'],
+    multiprocess_mode='livesum',
+)
+RESPONSE_CACHE = Counter(
+    'response_cache_requests_total',
+    'Response cache lookups by route template and result.',
+    ['route', 'result'],
+)
+
+content_type = CONTENT_TYPE_LATEST
+
+
+@contextmanager
+def track_in_flight():
+    REQUESTS_IN_FLIGHT.inc()
+    try:
+        yield
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+
+
+def observe_request(request, response, seconds: float):
+    route = request.scope.get('route')
+    REQUEST_LATENCY.labels(
+        method=request.method,
+        route=route.path if route else 'unmatched',
+        status=response.status_code,
+    ).observe(seconds)
+
+
+def set_stats(gauge: Gauge, stats: dict[str, float]):
+    for stat, value in stats.items():
+        gauge.labels(stat=stat).set(value)
+
+
+def set_pool_stats(stats: dict[str, float]):
+    """Export the pool's current state; its totals count themselves."""
+    if not stats:
+        return
+
+    set_stats(DB_POOL, {stat: stats[stat] for stat in POOL_STATE})
+    DB_POOL_WAIT_SECONDS_MAX.set(stats['wait_seconds_max'])
+
+
+def render() -> bytes:
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return generate_latest(REGISTRY)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def mark_process_dead():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
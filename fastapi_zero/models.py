@@ -1,12 +1,33 @@
 from datetime import datetime
 from enum import Enum
 
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import DDL, ForeignKey, Index, event, func, text
 from sqlalchemy.orm import Mapped, mapped_column, registry, relationship
 
 table_registry = registry()
 
 
+def _pg_trgm_available(ddl, target, bind, **kw):
+    """Whether the server ships pg_trgm, which is part of contrib."""
+    return bind is None or bool(
+        bind.scalar(
+            text(
+                "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+            )
+        )
+    )
+
+
+def _trigram_index(column: str):
+    return Index(
+        f'ix_todos_{column}_trgm',
+        column,
+        postgresql_using='gin',
+        postgresql_ops={column: 'gin_trgm_ops'},
+        info={'dialect': 'postgresql'},
+    ).ddl_if(dialect='postgresql', callable_=_pg_trgm_available)
+
+
 class TodoState(str, Enum):
     draft = 'draft'
     todo = 'todo'
@@ -18,6 +39,7 @@ class TodoState(str, Enum):
 @table_registry.mapped_as_dataclass
 class User:
     __tablename__ = 'users'
+    __mapper_args__ = {'eager_defaults': True}
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     username: Mapped[str] = mapped_column(unique=True)
@@ -31,17 +53,44 @@ class User:
         server_default=func.now(),
         onupdate=func.now(),
     )
+    # Bumped with every write to the user's todos; see `counters`.
+    todos_version: Mapped[int] = mapped_column(
+        init=False, default=0, server_default='0'
+    )
+    todos_updated_at: Mapped[datetime] = mapped_column(
+        init=False, server_default=func.now()
+    )
 
     todos: Mapped[list['Todo']] = relationship(
         init=False,
         cascade='all, delete-orphan',
-        lazy='selectin',
+        lazy='raise',
     )
 
 
 @table_registry.mapped_as_dataclass
 class Todo:
     __tablename__ = 'todos'
+    __mapper_args__ = {'eager_defaults': True}
+    __table_args__ = (
+        Index('ix_todos_user_id_id', 'user_id', 'id'),
+        Index('ix_todos_user_id_state_id', 'user_id', 'state', 'id'),
+        # Full-text document for `q=` searches, kept in sync with
+        # `fastapi_zero.search.todo_document`. Other backends use LIKE.
+        Index(
+            'ix_todos_search',
+            text(
+                "(setweight(to_tsvector('simple', title), 'A') || "
+                "setweight(to_tsvector('simple', description), 'B'))"
+            ),
+            postgresql_using='gin',
+            info={'dialect': 'postgresql'},
+        ).ddl_if(dialect='postgresql'),
+        # `title=` and `description=` filters match substrings (LIKE
+        # '%x%'), which only trigram indexes can serve.
+        _trigram_index('title'),
+        _trigram_index('description'),
+    )
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     title: Mapped[str]
@@ -54,3 +103,25 @@ class Todo:
     updated_at: Mapped[datetime] = mapped_column(
         init=False, server_default=func.now(), onupdate=func.now()
     )
+
+
+event.listen(
+    Todo.__table__,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(
+        dialect='postgresql', callable_=_pg_trgm_available
+    ),
+)
+
+
+@table_registry.mapped_as_dataclass
+class TodoCounter:
+    """How many todos a user has in each state; see `counters`."""
+
+    __tablename__ = 'todo_counters'
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey('users.id', ondelete='CASCADE'), primary_key=True
+    )
+    state: Mapped[TodoState] = mapped_column(primary_key=True)
+    count: Mapped[int] = mapped_column(default=0)
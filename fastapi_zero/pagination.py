@@ -0,0 +1,31 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+
+def encode_cursor(last_id: int) -> str:
+    return urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+
+
+def paginate(query, key, page):
+    """Order `query` by `key` and apply the page's cursor, offset and limit.
+
+    With a cursor the query seeks past the last key already returned, so
+    deep pages cost the same as the first one.
+    """
+    if page.cursor:
+        query = query.where(key > decode_cursor(page.cursor))
+
+    return query.order_by(key).offset(page.offset).limit(page.limit)
+
+
+def next_cursor(rows, page) -> str | None:
+    if len(rows) < page.limit:
+        return None
+
+    return encode_cursor(rows[-1].id)
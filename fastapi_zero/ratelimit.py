@@ -0,0 +1,96 @@
+"""Request throttling and admission control shared by the routers."""
+
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from math import ceil
+from time import monotonic
+
+from fastapi import HTTPException, Request
+
+from fastapi_zero.cache import TTLCache
+
+
+class TokenBucket:
+    """Per-key token buckets refilled at `rate` tokens per second.
+
+    Each key may spend up to `burst` tokens at once. An idle bucket is
+    full again after `burst / rate` seconds, so buckets are forgotten
+    after that long and at most `maxsize` keys are tracked.
+    """
+
+    def __init__(self, rate: float, burst: int, maxsize: int = 10_000):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = TTLCache(maxsize=maxsize, ttl=burst / rate)
+
+    def acquire(self, key: str) -> float:
+        """Spend a token; return 0 or the seconds until one is available."""
+        now = monotonic()
+        tokens, updated_at = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+
+        if tokens < 1:
+            self._buckets.set(key, (tokens, now))
+            return (1 - tokens) / self.rate
+
+        self._buckets.set(key, (tokens - 1, now))
+        return 0
+
+    def check(self, key: str):
+        """Spend a token for `key` or reject the request with 429."""
+        wait = self.acquire(key)
+        if wait:
+            raise HTTPException(
+                status_code=HTTPStatus.TOO_MANY_REQUESTS,
+                detail='Too many requests',
+                headers={'Retry-After': str(ceil(wait))},
+            )
+
+    def clear(self):
+        self._buckets.clear()
+
+
+def client_ip(request: Request) -> str:
+    """The client's address, from `X-Forwarded-For` behind a proxy.
+
+    uvicorn only honours that header from `--forwarded-allow-ips`, which
+    must list the load balancers; otherwise every client is keyed by the
+    balancer's address.
+    """
+    return request.client.host if request.client else 'unknown'
+
+
+def rate_limit(bucket: TokenBucket, key=client_ip):
+    """Build a dependency charging `bucket` for each request.
+
+    `key` maps the request to the bucket to charge, by default the
+    client's address.
+    """
+
+    def dependency(request: Request):
+        bucket.check(key(request))
+
+    return dependency
+
+
+class ConcurrencyLimit:
+    """Admit at most `limit` holders at once, rejecting others with 503."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.in_flight >= self.limit:
+            raise HTTPException(
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                detail='Server busy, try again later',
+                headers={'Retry-After': '1'},
+            )
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
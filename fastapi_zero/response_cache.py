@@ -0,0 +1,185 @@
+"""Shared cache of serialized read responses.
+
+Entries are keyed by route, scope (whose data it is), that scope's
+generation and a hash of the normalized query. Write handlers call
+`invalidate` after committing, which bumps the scope's generation so
+every entry cached before the write becomes unreachable and ages out.
+"""
+
+from email.utils import parsedate_to_datetime
+from hashlib import blake2b
+from http import HTTPStatus
+from itertools import count
+
+import orjson
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from fastapi_zero.cache import TTLCache
+from fastapi_zero.conditional import is_fresh
+from fastapi_zero.metrics import RESPONSE_CACHE
+from fastapi_zero.settings import Settings, get_settings
+
+settings = get_settings()
+
+
+class MemoryBackend:
+    """Per-process backend: an LRU of entries expiring after `ttl`.
+
+    Invalidations only reach the worker that handled the write; the
+    others serve their copy until it expires.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Generations are never reused, so a forgotten scope restarts at
+        # one no entry was cached under. Keeping them as long as entries
+        # only avoids needless misses.
+        self._generations = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._next_generation = count()
+
+    async def get(self, key: str) -> bytes | None:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        self._entries.set(key, value)
+
+    async def generation(self, scope: str) -> int:
+        generation = self._generations.get(scope)
+        if generation is None:
+            generation = next(self._next_generation)
+            self._generations.set(scope, generation)
+        return generation
+
+    async def bump(self, scope: str) -> None:
+        self._generations.set(scope, next(self._next_generation))
+
+
+class RedisBackend:
+    """Backend on any Redis-protocol server, shared by all workers.
+
+    Entries get a TTL and generations don't, so run the server with
+    `maxmemory-policy volatile-lru` to bound its size without evicting
+    generations.
+    """
+
+    def __init__(self, client, ttl: float):
+        self.client = client
+        self._ttl_ms = int(ttl * 1000)
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.client.set(key, value, px=self._ttl_ms)
+
+    async def generation(self, scope: str) -> int:
+        return int(await self.client.get(f'generation:{scope}') or 0)
+
+    async def bump(self, scope: str) -> None:
+        await self.client.incr(f'generation:{scope}')
+
+
+class CachedResponse:
+    def __init__(self, headers: dict[str, str], body: bytes):
+        self.headers = headers
+        self.body = body
+
+    def encode(self) -> bytes:
+        return orjson.dumps(self.headers) + b'\n' + self.body
+
+    @classmethod
+    def decode(cls, value: bytes) -> 'CachedResponse':
+        headers, body = value.split(b'\n', 1)
+        return cls(orjson.loads(headers), body)
+
+    def respond(self, request: Request) -> Response:
+        last_modified = self.headers.get('Last-Modified')
+        if is_fresh(
+            request,
+            self.headers['ETag'],
+            last_modified and parsedate_to_datetime(last_modified),
+        ):
+            return Response(
+                status_code=HTTPStatus.NOT_MODIFIED, headers=self.headers
+            )
+
+        return Response(
+            self.body, media_type='application/json', headers=self.headers
+        )
+
+
+class ResponseCache:
+    def __init__(self, backend: MemoryBackend | RedisBackend | None):
+        self.backend = backend
+
+    async def lookup(
+        self, request: Request, scope: str, query: BaseModel | None = None
+    ) -> tuple[str | None, Response | None]:
+        """Return the entry's key and, on a hit, the response to send.
+
+        The key is None when caching is disabled.
+        """
+        if self.backend is None:
+            return None, None
+
+        route = request.scope['route'].path
+        generation = await self.backend.generation(scope)
+        params = query.model_dump_json().encode() if query else b''
+        digest = blake2b(params, digest_size=12).hexdigest()
+        key = f'response:{route}:{scope}:{generation}:{digest}'
+
+        value = await self.backend.get(key)
+        RESPONSE_CACHE.labels(
+            route=route, result='miss' if value is None else 'hit'
+        ).inc()
+        if value is None:
+            return key, None
+
+        return key, CachedResponse.decode(value).respond(request)
+
+    async def store(
+        self,
+        key: str,
+        request: Request,
+        model: type[BaseModel],
+        content,
+        headers: dict[str, str],
+    ) -> Response:
+        """Serialize `content` through `model`, cache it and respond."""
+        body = model.model_validate(
+            content, from_attributes=True
+        ).model_dump_json()
+        cached = CachedResponse(headers, body.encode())
+        await self.backend.set(key, cached.encode())
+        return cached.respond(request)
+
+    async def invalidate(self, *scopes: str) -> None:
+        if self.backend is None:
+            return
+
+        for scope in scopes:
+            await self.backend.bump(scope)
+
+
+def create_backend(settings: Settings) -> MemoryBackend | RedisBackend | None:
+    match settings.RESPONSE_CACHE_BACKEND:
+        case 'memory':
+            return MemoryBackend(
+                maxsize=settings.RESPONSE_CACHE_SIZE,
+                ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+            )
+        case 'redis':
+            # Imported only when configured; the client adds noticeably
+            # to startup.
+            from redis.asyncio import Redis  # noqa: PLC0415
+
+            return RedisBackend(
+                Redis.from_url(settings.REDIS_URL),
+                ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+            )
+        case _:
+            return None
+
+
+response_cache = ResponseCache(create_backend(settings))
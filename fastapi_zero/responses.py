@@ -0,0 +1,16 @@
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def fast_list_response(
+    name: str, rows, model: type[BaseModel], **extra
+) -> ORJSONResponse:
+    """Serialize a list page straight from rows with orjson.
+
+    This skips the response model's validation and serialization, so the
+    rows must already carry every field of `model` with JSON-ready types.
+    """
+    fields = tuple(model.model_fields)
+    items = [{field: getattr(row, field) for field in fields} for row in rows]
+
+    return ORJSONResponse({name: items, **extra})
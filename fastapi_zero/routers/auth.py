@@ -6,48 +6,88 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastapi_zero.database import get_session
+from fastapi_zero.database import get_replicas, get_session
 from fastapi_zero.models import User
-from fastapi_zero.schemas import Token
+from fastapi_zero.ratelimit import ConcurrencyLimit, TokenBucket, rate_limit
+from fastapi_zero.response_cache import response_cache
+from fastapi_zero.schemas import Token, UserPrincipal
 from fastapi_zero.security import (
     create_access_token,
     get_current_user,
-    verify_password,
+    token_claims,
+    verify_and_update_password_async,
+    verify_unknown_user_async,
 )
+from fastapi_zero.settings import get_settings
 
 router = APIRouter(prefix='/auth', tags=['auth'])
+settings = get_settings()
+
+login_ip_bucket = TokenBucket(
+    rate=settings.LOGIN_IP_RATE_PER_MINUTE / 60,
+    burst=settings.LOGIN_IP_BURST,
+)
+login_account_bucket = TokenBucket(
+    rate=settings.LOGIN_ACCOUNT_RATE_PER_MINUTE / 60,
+    burst=settings.LOGIN_ACCOUNT_BURST,
+)
+# Logins may only take part of the hashing pool, so a burst of them
+# can't starve sign-ups and password changes.
+login_verifications = ConcurrencyLimit(
+    settings.LOGIN_MAX_CONCURRENT_VERIFICATIONS
+)
 
 Session = Annotated[AsyncSession, Depends(get_session)]
-CurrentUser = Annotated[User, Depends(get_current_user)]
+CurrentUser = Annotated[UserPrincipal, Depends(get_current_user)]
 OAuth2Form = Annotated[OAuth2PasswordRequestForm, Depends()]
 
 
-@router.post('/token', response_model=Token)
+@router.post(
+    '/token',
+    response_model=Token,
+    dependencies=[Depends(rate_limit(login_ip_bucket))],
+)
 async def login_for_access_token(
     form_data: OAuth2Form,
     session: Session,
 ):
+    login_account_bucket.check(form_data.username.lower())
+
     user = await session.scalar(
         select(User).where(User.email == form_data.username)
     )
 
-    if not user:
-        raise HTTPException(
-            status_code=HTTPStatus.UNAUTHORIZED,
-            detail='Incorrect email or password',
-        )
-    if not verify_password(form_data.password, user.password):
+    async with login_verifications.slot():
+        if user:
+            valid, new_hash = await verify_and_update_password_async(
+                form_data.password, user.password
+            )
+        else:
+            valid, new_hash = await verify_unknown_user_async(
+                form_data.password
+            )
+
+    if not valid:
         raise HTTPException(
             status_code=HTTPStatus.UNAUTHORIZED,
             detail='Incorrect email or password',
         )
-    access_token = create_access_token(data={'sub': user.email})
+
+    if new_hash:
+        user.password = new_hash
+        await session.commit()
+        # The hash isn't exposed, but the write moves `updated_at`, which
+        # the cached representation and its validators are built from.
+        await get_replicas().mark_write(user.id)
+        await response_cache.invalidate(f'users:{user.id}')
+
+    access_token = create_access_token(data=token_claims(user))
 
     return {'access_token': access_token, 'token_type': 'Bearer'}
 
 
 @router.post('/refresh_token', response_model=Token)
 async def refresh_access_token(user: CurrentUser):
-    new_access_token = create_access_token(data={'sub': user.email})
+    new_access_token = create_access_token(data=token_claims(user))
 
     return {'access_token': new_access_token, 'token_type': 'bearer'}
@@ -1,26 +1,158 @@
+import asyncio
+import csv
+import io
+from collections import Counter
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
+import orjson
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    status,
+)
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastapi_zero.database import get_session
-from fastapi_zero.models import Todo, User
+from fastapi_zero.conditional import (
+    is_fresh,
+    make_etag,
+    not_modified,
+    validators,
+)
+from fastapi_zero.counters import (
+    adjust_todo_counts,
+    bump_todos_version,
+    todo_counts,
+    todos_version,
+)
+from fastapi_zero.database import get_replicas, get_session, may_be_stale
+from fastapi_zero.events import broker, publish
+from fastapi_zero.models import Todo, TodoState
+from fastapi_zero.pagination import next_cursor, paginate
+from fastapi_zero.response_cache import response_cache
+from fastapi_zero.responses import fast_list_response
 from fastapi_zero.schemas import (
     FilterTodo,
+    FilterTodoBulk,
+    FilterTodoExport,
     Message,
+    TodoBulkResult,
     TodoList,
     TodoPublic,
     TodoSchema,
+    TodoStats,
     TodoUpdate,
+    UserPrincipal,
 )
-from fastapi_zero.security import get_current_user
+from fastapi_zero.search import search_todos
+from fastapi_zero.security import (
+    get_current_user,
+    get_read_session,
+    get_reader,
+)
+from fastapi_zero.settings import get_settings
 
 router = APIRouter(prefix='/todos', tags=['todos'])
+settings = get_settings()
 
 Session = Annotated[AsyncSession, Depends(get_session)]
-CurrentUSer = Annotated[User, Depends(get_current_user)]
+ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
+CurrentUSer = Annotated[UserPrincipal, Depends(get_current_user)]
+Reader = Annotated[UserPrincipal, Depends(get_reader)]
+
+# Lists load plain rows with just the columns the response needs, skipping
+# entity construction and the identity map.
+TODO_PUBLIC_COLUMNS = [
+    getattr(Todo, field) for field in TodoPublic.model_fields
+]
+
+
+EXPORT_COLUMNS = [
+    Todo.id,
+    Todo.title,
+    Todo.description,
+    Todo.state,
+    Todo.created_at,
+    Todo.updated_at,
+]
+
+
+def _cache_scope(user_id: int) -> str:
+    return f'todos:{user_id}'
+
+
+async def _record_change(
+    session,
+    user_id: int,
+    kind: str,
+    ids: list[int],
+    deltas: dict[TodoState, int] | None = None,
+):
+    """Bump the user's todos version and publish the change event.
+
+    `deltas` are the changes to the user's per-state todo counts.
+    """
+    await bump_todos_version(session, user_id)
+    if deltas:
+        await adjust_todo_counts(session, user_id, deltas)
+    await publish(session, user_id, kind, ids)
+
+
+def _transitions(previous: list[TodoState], state: TodoState):
+    """Count deltas for moving todos from their `previous` states."""
+    deltas = Counter({state: len(previous)})
+    deltas.subtract(previous)
+    return deltas
+
+
+async def _update_tracking_state(session, selected, changes: dict, returned):
+    """UPDATE the todos found by `selected`, a SELECT of id and state.
+
+    Returns `(returned, previous state)` pairs, one per updated todo. The
+    SELECT locks the rows, so that state is the one being replaced. On
+    PostgreSQL it runs as the UPDATE's FROM and the previous state comes
+    back in its RETURNING; other backends can't return columns of the
+    FROM, so they read the states first, in the same transaction.
+    """
+    if session.bind.dialect.name == 'postgresql':
+        previous = selected.with_for_update().subquery()
+        rows = await session.execute(
+            update(Todo)
+            .where(Todo.id == previous.c.id)
+            .values(**changes)
+            .returning(returned, previous.c.state)
+        )
+        return rows.all()
+
+    states = dict((await session.execute(selected)).all())
+    if not states:
+        return []
+    rows = await session.execute(
+        update(Todo)
+        .where(Todo.id.in_(states))
+        .values(**changes)
+        .returning(Todo.id, returned)
+    )
+    return [(value, states[todo_id]) for todo_id, value in rows]
+
+
+async def _commit_todos(session, user_id: int):
+    """Commit a write to the user's todos and drop their cached lists.
+
+    The user's reads then stick to the primary until replicas catch up.
+    """
+    await session.commit()
+    await get_replicas().mark_write(user_id)
+    await response_cache.invalidate(_cache_scope(user_id))
 
 
 @router.post('/', response_model=TodoPublic)
@@ -37,32 +169,402 @@ async def create_todo(
     )
 
     session.add(db_todo)
-    await session.commit()
-    await session.refresh(db_todo)
+    await session.flush()
+    await _record_change(
+        session, user.id, 'created', [db_todo.id], {db_todo.state: 1}
+    )
+    await _commit_todos(session, user.id)
     return db_todo
 
 
-@router.get('/', response_model=TodoList)
-async def list_todos(
-    user: CurrentUSer,
-    session: Session,
-    todo_filter: Annotated[FilterTodo, Query()],
-):
-    query = select(Todo).where(Todo.user_id == user.id)
+def _filter_todos(statement, user_id: int, todo_filter):
+    """Scope a SELECT, UPDATE or DELETE on todos to one user's filter."""
+    statement = statement.where(Todo.user_id == user_id)
 
     if todo_filter.title:
-        query = query.filter(Todo.title.contains(todo_filter.title))
+        statement = statement.where(Todo.title.contains(todo_filter.title))
     if todo_filter.description:
-        query = query.filter(
+        statement = statement.where(
             Todo.description.contains(todo_filter.description)
         )
     if todo_filter.state:
-        query = query.filter(Todo.state == todo_filter.state)
+        statement = statement.where(Todo.state == todo_filter.state)
+
+    return statement
+
+
+def _select_todos_bulk(statement, user_id: int, todo_filter: FilterTodoBulk):
+    statement = _filter_todos(statement, user_id, todo_filter)
+
+    if todo_filter.ids:
+        statement = statement.where(Todo.id.in_(todo_filter.ids))
 
-    todos = await session.scalars(
-        query.limit(todo_filter.limit).offset(todo_filter.offset)
+    return statement
+
+
+async def _insert_todos(session, user_id: int, todos: list[TodoSchema]):
+    """Insert `todos` with one multi-row INSERT ... RETURNING."""
+    if not todos:
+        return []
+
+    rows = [{**todo.model_dump(), 'user_id': user_id} for todo in todos]
+    created = await session.scalars(
+        insert(Todo).returning(Todo, sort_by_parameter_order=True), rows
+    )
+    return created.all()
+
+
+async def _ndjson_lines(request: Request):
+    buffer = b''
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line
+    yield buffer
+
+
+@router.post('/bulk', response_model=TodoList)
+async def create_todos_bulk(
+    todos: list[TodoSchema],
+    session: Session,
+    user: CurrentUSer,
+):
+    batch_size = settings.BULK_INSERT_BATCH_SIZE
+    created = []
+
+    for start in range(0, len(todos), batch_size):
+        created += await _insert_todos(
+            session, user.id, todos[start : start + batch_size]
+        )
+
+    if created:
+        await _record_change(
+            session,
+            user.id,
+            'created',
+            [todo.id for todo in created],
+            Counter(todo.state for todo in created),
+        )
+    await _commit_todos(session, user.id)
+    return {'todos': created}
+
+
+@router.post('/bulk/ndjson', response_model=TodoList)
+async def create_todos_ndjson(
+    request: Request,
+    session: Session,
+    user: CurrentUSer,
+):
+    """Create todos from a newline-delimited JSON stream.
+
+    Batches are inserted while the body is still arriving; any invalid
+    line rolls the whole import back and is reported with its line number.
+    """
+    errors = []
+    batch = []
+    created = []
+
+    line_number = 0
+    async for line in _ndjson_lines(request):
+        line_number += 1
+        if not line.strip():
+            continue
+
+        try:
+            batch.append(TodoSchema.model_validate_json(line))
+        except ValidationError as exc:
+            errors += [
+                {**error, 'loc': ('body', line_number, *error['loc'])}
+                for error in exc.errors(include_url=False)
+            ]
+
+        if len(batch) == settings.BULK_INSERT_BATCH_SIZE and not errors:
+            created += await _insert_todos(session, user.id, batch)
+            batch = []
+
+    if errors:
+        await session.rollback()
+        raise RequestValidationError(errors)
+
+    created += await _insert_todos(session, user.id, batch)
+    if created:
+        await _record_change(
+            session,
+            user.id,
+            'created',
+            [todo.id for todo in created],
+            Counter(todo.state for todo in created),
+        )
+    await _commit_todos(session, user.id)
+    return {'todos': created}
+
+
+@router.get('/', response_model=TodoList)
+async def list_todos(
+    request: Request,
+    response: Response,
+    user: Reader,
+    session: ReadSession,
+    todo_filter: Annotated[FilterTodo, Query()],
+):
+    cache_key, cached = await response_cache.lookup(
+        request, _cache_scope(user.id), todo_filter
+    )
+    if cached:
+        return cached
+
+    # Every write to the user's todos bumps their version, so it validates
+    # every page and filter of the list with one primary-key lookup.
+    version, last_modified = await todos_version(session, user.id)
+    etag = make_etag(
+        user.id, version, sorted(request.query_params.multi_items())
     )
-    return {'todos': todos.all()}
+    headers = validators(etag, last_modified)
+
+    if is_fresh(request, etag, last_modified):
+        return not_modified(headers)
+
+    query = _filter_todos(select(*TODO_PUBLIC_COLUMNS), user.id, todo_filter)
+
+    if todo_filter.q:
+        query = search_todos(query, todo_filter.q, session.bind.dialect.name)
+
+    todos = (
+        await session.execute(paginate(query, Todo.id, todo_filter))
+    ).all()
+
+    cursor = None if todo_filter.q else next_cursor(todos, todo_filter)
+
+    if cache_key and not await may_be_stale(session, user.id):
+        return await response_cache.store(
+            cache_key,
+            request,
+            TodoList,
+            {'todos': todos, 'next_cursor': cursor},
+            headers,
+        )
+
+    if settings.FAST_JSON_RESPONSES:
+        fast_response = fast_list_response(
+            'todos', todos, TodoPublic, next_cursor=cursor
+        )
+        fast_response.headers.update(headers)
+        return fast_response
+
+    response.headers.update(headers)
+    return {'todos': todos, 'next_cursor': cursor}
+
+
+async def _export_partitions(engine, query):
+    """Yield the rows of `query` in `EXPORT_FETCH_SIZE` partitions.
+
+    Rows come from a server-side cursor in a session of their own: the
+    request's session is closed when the handler returns, before the
+    body is streamed.
+    """
+    async with AsyncSession(engine) as session:
+        result = await session.stream(
+            query.execution_options(yield_per=settings.EXPORT_FETCH_SIZE)
+        )
+        async for rows in result.partitions():
+            yield rows
+
+
+async def _ndjson_export(partitions):
+    async for rows in partitions:
+        yield b''.join(orjson.dumps(row._asdict()) + b'\n' for row in rows)
+
+
+def _csv_chunk(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+async def _csv_export(partitions):
+    yield _csv_chunk([[column.key for column in EXPORT_COLUMNS]])
+
+    async for rows in partitions:
+        yield _csv_chunk(
+            (
+                row.id,
+                row.title,
+                row.description,
+                row.state.value,
+                row.created_at.isoformat(),
+                row.updated_at.isoformat(),
+            )
+            for row in rows
+        )
+
+
+@router.get('/stats', response_model=TodoStats)
+async def todo_stats(user: Reader, session: ReadSession):
+    """How many todos the user has in each state.
+
+    Read from the counters the write handlers maintain, so the cost does
+    not grow with the number of todos.
+    """
+    states = await todo_counts(session, user.id)
+    return {'total': sum(states.values()), 'states': states}
+
+
+@router.get('/export')
+async def export_todos(
+    user: Reader,
+    session: Session,
+    todo_filter: Annotated[FilterTodoExport, Query()],
+):
+    """Stream every matching todo as NDJSON or CSV, in id order."""
+    query = _filter_todos(
+        select(*EXPORT_COLUMNS), user.id, todo_filter
+    ).order_by(Todo.id)
+    partitions = _export_partitions(session.bind, query)
+
+    if todo_filter.format == 'csv':
+        return StreamingResponse(
+            _csv_export(partitions),
+            media_type='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=todos.csv'},
+        )
+
+    return StreamingResponse(
+        _ndjson_export(partitions), media_type='application/x-ndjson'
+    )
+
+
+def _sse_message(todo_event: dict) -> str:
+    data = orjson.dumps(todo_event).decode()
+    return f'event: {todo_event["type"]}\ndata: {data}\n\n'
+
+
+async def _sse_stream(user_id: int):
+    async with broker.subscribe(user_id) as queue:
+        # Sends the headers right away, before the first change.
+        yield ': connected\n\n'
+        while True:
+            try:
+                todo_event = await asyncio.wait_for(
+                    queue.get(), settings.EVENTS_HEARTBEAT_SECONDS
+                )
+            except TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+
+            yield _sse_message(todo_event)
+
+
+@router.get('/events')
+async def todo_events(user: Reader):
+    """Server-sent events for changes to the caller's todos.
+
+    Each event is `created`, `updated` or `deleted` with the affected
+    ids (null for very large changes), or `resync` when the stream fell
+    behind; refetch the list after a `resync`.
+    """
+    return StreamingResponse(
+        _sse_stream(user.id),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+async def _forward_events(websocket: WebSocket, queue: asyncio.Queue):
+    while True:
+        await websocket.send_json(await queue.get())
+
+
+@router.websocket('/events')
+async def todo_events_ws(
+    websocket: WebSocket, session: Session, token: str | None = None
+):
+    """The `/todos/events` feed over a WebSocket, one JSON per event.
+
+    Browsers can't set headers on WebSockets, so the access token may
+    also be passed as the `token` query parameter.
+    """
+    if not token:
+        authorization = websocket.headers.get('authorization', '')
+        token = authorization.removeprefix('Bearer ')
+
+    try:
+        user = await get_reader(session, token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    finally:
+        # Don't hold a pooled connection for the socket's lifetime.
+        await session.close()
+
+    await websocket.accept()
+    async with broker.subscribe(user.id) as queue:
+        forward = asyncio.create_task(_forward_events(websocket, queue))
+        try:
+            message = {}
+            while message.get('type') != 'websocket.disconnect':
+                message = await websocket.receive()
+        finally:
+            forward.cancel()
+            # Collects the task's error too, e.g. sending on a socket the
+            # client already closed.
+            await asyncio.gather(forward, return_exceptions=True)
+
+
+@router.patch('/', response_model=TodoBulkResult)
+async def patch_todos_bulk(
+    todo: TodoUpdate,
+    session: Session,
+    user: CurrentUSer,
+    todo_filter: Annotated[FilterTodoBulk, Query()],
+):
+    changes = todo.model_dump(exclude_unset=True)
+
+    if not changes:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST, detail='Nothing to update'
+        )
+
+    rows = await _update_tracking_state(
+        session,
+        _select_todos_bulk(select(Todo.id, Todo.state), user.id, todo_filter),
+        changes,
+        Todo.id,
+    )
+    ids = [todo_id for todo_id, _ in rows]
+    if ids:
+        deltas = None
+        if changes.get('state'):
+            deltas = _transitions(
+                [previous for _, previous in rows], changes['state']
+            )
+        await _record_change(session, user.id, 'updated', ids, deltas)
+    await _commit_todos(session, user.id)
+
+    return {'count': len(ids), 'ids': ids}
+
+
+@router.delete('/', response_model=TodoBulkResult)
+async def delete_todos_bulk(
+    session: Session,
+    user: CurrentUSer,
+    todo_filter: Annotated[FilterTodoBulk, Query()],
+):
+    rows = (
+        await session.execute(
+            _select_todos_bulk(delete(Todo), user.id, todo_filter).returning(
+                Todo.id, Todo.state
+            )
+        )
+    ).all()
+    ids = [row.id for row in rows]
+    if ids:
+        deltas = Counter()
+        deltas.subtract(row.state for row in rows)
+        await _record_change(session, user.id, 'deleted', ids, deltas)
+    await _commit_todos(session, user.id)
+
+    return {'count': len(ids), 'ids': ids}
 
 
 @router.delete('/{todo_id}', response_model=Message)
@@ -71,16 +573,21 @@ async def delete_todo(
     session: Session,
     user: CurrentUSer,
 ):
-    todo = await session.scalar(
-        select(Todo).where(Todo.user_id == user.id, Todo.id == todo_id)
+    # The state comes from the deleted row itself, so a concurrent state
+    # change can't make us decrement the wrong counter.
+    state = await session.scalar(
+        delete(Todo)
+        .where(Todo.user_id == user.id, Todo.id == todo_id)
+        .returning(Todo.state)
     )
 
-    if not todo:
+    if state is None:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='Task not found!'
         )
 
-    await session.delete(todo)
+    await _record_change(session, user.id, 'deleted', [todo_id], {state: -1})
+    await _commit_todos(session, user.id)
 
     return {'message': 'Task has been deleted successfully.'}
 
@@ -92,19 +599,27 @@ async def patch_todo(
     session: Session,
     user: CurrentUSer,
 ):
-    db_todo = await session.scalar(
-        select(Todo).where(Todo.user_id == user.id, Todo.id == todo_id)
+    selected = select(Todo.id, Todo.state).where(
+        Todo.user_id == user.id, Todo.id == todo_id
     )
+    changes = todo.model_dump(exclude_unset=True)
+
+    if changes:
+        [(db_todo, previous)] = await _update_tracking_state(
+            session, selected, changes, Todo
+        ) or [(None, None)]
+    else:
+        db_todo = await session.scalar(selected.with_only_columns(Todo))
 
     if not db_todo:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND, detail='Task not found!'
         )
 
-    for key, value in todo.model_dump(exclude_unset=True).items():
-        setattr(db_todo, key, value)
-
-    session.add(db_todo)
-    await session.commit()
-    await session.refresh(db_todo)
+    if changes:
+        deltas = None
+        if changes.get('state'):
+            deltas = _transitions([previous], changes['state'])
+        await _record_change(session, user.id, 'updated', [todo_id], deltas)
+    await _commit_todos(session, user.id)
     return db_todo
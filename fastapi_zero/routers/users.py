@@ -1,29 +1,57 @@
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from fastapi_zero.database import get_session
+from fastapi_zero.conditional import (
+    is_fresh,
+    make_etag,
+    not_modified,
+    validators,
+)
+from fastapi_zero.database import get_replicas, get_session, may_be_stale
 from fastapi_zero.models import User
+from fastapi_zero.pagination import next_cursor, paginate
+from fastapi_zero.response_cache import response_cache
+from fastapi_zero.responses import fast_list_response
 from fastapi_zero.schemas import (
     FilterPage,
     Message,
     UserList,
+    UserPrincipal,
     UserPublic,
     UserSchema,
 )
 from fastapi_zero.security import (
+    credentials_exception,
     get_current_user,
-    get_password_hash,
+    get_password_hash_async,
+    get_read_session,
+    get_reader,
+    invalidate_principal,
+    load_current_user,
+    revoke_tokens,
 )
+from fastapi_zero.settings import get_settings
 
 router = APIRouter(prefix='/users', tags=['users'])
+settings = get_settings()
 
 Session = Annotated[AsyncSession, Depends(get_session)]
-CurrentUser = Annotated[User, Depends(get_current_user)]
+ReadSession = Annotated[AsyncSession, Depends(get_read_session)]
+CurrentUser = Annotated[UserPrincipal, Depends(get_current_user)]
+Reader = Annotated[UserPrincipal, Depends(get_reader)]
+CurrentUserWithTodos = Annotated[
+    User, Depends(load_current_user(selectinload(User.todos)))
+]
+
+USER_PUBLIC_COLUMNS = [
+    getattr(User, field) for field in UserPublic.model_fields
+]
 
 
 @router.post('/', status_code=HTTPStatus.CREATED, response_model=UserPublic)
@@ -49,37 +77,68 @@ async def create_user(user: UserSchema, session: Session):
     db_user = User(
         username=user.username,
         email=user.email,
-        password=get_password_hash(user.password),
+        password=await get_password_hash_async(user.password),
     )
 
     session.add(db_user)
     await session.commit()
-    await session.refresh(db_user)
 
     return db_user
 
 
 @router.get('/', status_code=HTTPStatus.OK, response_model=UserList)
 async def read_users(
-    session: Session,
-    current_user: CurrentUser,
+    session: ReadSession,
+    current_user: Reader,
     filter_users: Annotated[FilterPage, Query()],
 ):
-    users = await session.scalars(
-        select(User).offset(filter_users.offset).limit(filter_users.limit)
-    )
-    return {'users': users}
+    users = (
+        await session.execute(
+            paginate(select(*USER_PUBLIC_COLUMNS), User.id, filter_users)
+        )
+    ).all()
+    cursor = next_cursor(users, filter_users)
+
+    if settings.FAST_JSON_RESPONSES:
+        return fast_list_response(
+            'users', users, UserPublic, next_cursor=cursor
+        )
+    return {'users': users, 'next_cursor': cursor}
 
 
 @router.get('/{user_id}', response_model=UserPublic)
-async def read_user(user_id: int, session: Session):
-    db_user = await session.scalar(select(User).where(User.id == user_id))
+async def read_user(
+    user_id: int, request: Request, response: Response, session: ReadSession
+):
+    cache_key, cached = await response_cache.lookup(
+        request, f'users:{user_id}'
+    )
+    if cached:
+        return cached
+
+    db_user = (
+        await session.execute(
+            select(*USER_PUBLIC_COLUMNS, User.updated_at).where(
+                User.id == user_id
+            )
+        )
+    ).one_or_none()
     if not db_user:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail='User not found!',
         )
 
+    headers = validators(make_etag(*db_user), db_user.updated_at)
+    if is_fresh(request, headers['ETag'], db_user.updated_at):
+        return not_modified(headers)
+
+    if cache_key and not await may_be_stale(session, user_id):
+        return await response_cache.store(
+            cache_key, request, UserPublic, db_user, headers
+        )
+
+    response.headers.update(headers)
     return db_user
 
 
@@ -96,25 +155,43 @@ async def update_user(
             detail='Not enough permissions',
         )
 
+    password = await get_password_hash_async(user.password)
+
     try:
-        current_user.username = user.username
-        current_user.password = get_password_hash(user.password)
-        current_user.email = user.email
+        db_user = await session.scalar(
+            update(User)
+            .where(User.id == current_user.id)
+            .values(
+                username=user.username, password=password, email=user.email
+            )
+            .returning(User)
+        )
         await session.commit()
-        await session.refresh(current_user)
-        return current_user
     except IntegrityError:
+        await session.rollback()
         raise HTTPException(
             status_code=HTTPStatus.CONFLICT,
             detail='Username or Email already exists',
         )
 
+    if db_user is None:
+        # Deleted since the principal was cached, maybe by another worker.
+        invalidate_principal(current_user.email)
+        raise credentials_exception
+
+    invalidate_principal(current_user.email, db_user.email)
+    revoke_tokens(current_user.id)
+    await get_replicas().mark_write(user_id)
+    await response_cache.invalidate(f'users:{user_id}')
+
+    return db_user
+
 
 @router.delete('/{user_id}', response_model=Message)
 async def delete_user(
     user_id: int,
     session: Session,
-    current_user: CurrentUser,
+    current_user: CurrentUserWithTodos,
 ):
     if current_user.id != user_id:
         raise HTTPException(
@@ -124,5 +201,9 @@ async def delete_user(
 
     await session.delete(current_user)
     await session.commit()
+    invalidate_principal(current_user.email)
+    revoke_tokens(current_user.id)
+    await get_replicas().mark_write(user_id)
+    await response_cache.invalidate(f'users:{user_id}')
 
     return {'message': 'User deleted'}
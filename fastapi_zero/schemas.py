@@ -1,8 +1,17 @@
 from datetime import datetime
+from typing import Literal
 
-from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    EmailStr,
+    Field,
+    field_validator,
+    model_validator,
+)
 
 from fastapi_zero.models import TodoState
+from fastapi_zero.pagination import decode_cursor
 
 
 class Message(BaseModel):
@@ -22,12 +31,20 @@ class UserPublic(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class UserPrincipal(BaseModel):
+    id: int
+    username: str
+    email: str
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+
 class UserDB(UserSchema):
     id: int
 
 
 class UserList(BaseModel):
     users: list[UserPublic]
+    next_cursor: str | None = None
 
 
 class Token(BaseModel):
@@ -38,12 +55,52 @@ class Token(BaseModel):
 class FilterPage(BaseModel):
     offset: int = Field(ge=0, default=0)
     limit: int = Field(ge=1, le=100, default=100)
+    cursor: str | None = None
+
+    @field_validator('cursor')
+    @classmethod
+    def validate_cursor(cls, cursor: str | None):
+        if cursor is not None:
+            decode_cursor(cursor)
+        return cursor
 
 
 class FilterTodo(FilterPage):
     title: str | None = Field(default=None, min_length=3)
     description: str | None = None
     state: TodoState | None = None
+    q: str | None = Field(default=None, min_length=3)
+
+    @model_validator(mode='after')
+    def validate_search_paging(self):
+        if self.q and self.cursor:
+            raise ValueError('Search results are paged with offset only')
+        return self
+
+
+class FilterTodoExport(BaseModel):
+    title: str | None = Field(default=None, min_length=3)
+    description: str | None = None
+    state: TodoState | None = None
+    format: Literal['ndjson', 'csv'] = 'ndjson'
+
+
+class FilterTodoBulk(BaseModel):
+    ids: list[int] | None = None
+    title: str | None = Field(default=None, min_length=3)
+    description: str | None = None
+    state: TodoState | None = None
+
+    @model_validator(mode='after')
+    def validate_selection(self):
+        if not (self.ids or self.title or self.description or self.state):
+            raise ValueError('Select todos by ids or at least one filter')
+        return self
+
+
+class TodoBulkResult(BaseModel):
+    count: int
+    ids: list[int]
 
 
 class TodoUpdate(BaseModel):
@@ -66,3 +123,9 @@ class TodoPublic(TodoSchema):
 
 class TodoList(BaseModel):
     todos: list[TodoPublic]
+    next_cursor: str | None = None
+
+
+class TodoStats(BaseModel):
+    total: int
+    states: dict[TodoState, int]
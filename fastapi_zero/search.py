@@ -0,0 +1,42 @@
+from sqlalchemy import case, func, literal_column, or_
+
+from fastapi_zero.models import Todo
+
+
+def _weighted_document(column, weight):
+    return func.setweight(
+        func.to_tsvector(literal_column("'simple'"), column),
+        literal_column(f"'{weight}'"),
+    )
+
+
+# Must stay the same expression as the `ix_todos_search` index.
+todo_document = _weighted_document(Todo.title, 'A').op('||')(
+    _weighted_document(Todo.description, 'B')
+)
+
+
+def search_todos(query, q: str, dialect: str):
+    """Restrict `query` to todos matching `q`, best matches first.
+
+    PostgreSQL uses the full-text index; other backends fall back to
+    matching every word with LIKE and rank title hits above description
+    hits.
+    """
+    if dialect == 'postgresql':
+        tsquery = func.websearch_to_tsquery(literal_column("'simple'"), q)
+        return query.where(todo_document.bool_op('@@')(tsquery)).order_by(
+            func.ts_rank(todo_document, tsquery).desc()
+        )
+
+    terms = q.split() or [q]
+    rank = 0
+    for term in terms:
+        in_title = Todo.title.icontains(term, autoescape=True)
+        in_description = Todo.description.icontains(term, autoescape=True)
+        query = query.where(or_(in_title, in_description))
+        rank += case((in_title, 2), else_=0) + case(
+            (in_description, 1), else_=0
+        )
+
+    return query.order_by(rank.desc())
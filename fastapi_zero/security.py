@@ -1,29 +1,172 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
 from datetime import datetime, timedelta
+from functools import cache
 from http import HTTPStatus
+from time import time
 from zoneinfo import ZoneInfo
 
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from jwt import DecodeError, ExpiredSignatureError, decode, encode
-from pwdlib import PasswordHash
+from jwt import ExpiredSignatureError, InvalidTokenError, decode, encode
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastapi_zero.database import get_session
+from fastapi_zero.cache import TTLCache
+from fastapi_zero.database import get_session, read_session
+from fastapi_zero.metrics import JWT_DECODE_FAILURES, PASSWORD_HASH_SECONDS
 from fastapi_zero.models import User
-from fastapi_zero.settings import Settings
+from fastapi_zero.schemas import UserPrincipal
+from fastapi_zero.settings import get_settings
 
-pwd_context = PasswordHash.recommended()
-settings = Settings()
+settings = get_settings()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/token')
+optional_oauth2_scheme = OAuth2PasswordBearer(
+    tokenUrl='auth/token', auto_error=False
+)
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+# Verified token payloads, so repeat requests skip signature checks.
+token_cache = TTLCache(
+    maxsize=settings.TOKEN_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+# When each user's tokens were last revoked: tokens issued (`iat`) before
+# then are rejected, while new ones pass wherever they were issued. It is
+# per process: other workers never see a revocation and a restart forgets
+# it, so only read endpoints trust the claims (see `get_reader`) and token
+# lifetimes should stay short.
+tokens_revoked_at: dict[int, float] = {}
+
+credentials_exception = HTTPException(
+    status_code=HTTPStatus.UNAUTHORIZED,
+    detail='Could not validate credentials',
+    headers={'WWW-Authenticate': 'Bearer'},
+)
+
+
+class HashingPool:
+    """Runs password hashing on worker threads, away from the event loop.
+
+    At most `workers` hashes run at once and `queue_size` more may wait;
+    beyond that callers are shed with 503 instead of piling up.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.capacity = workers + queue_size
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='password-hash'
+        )
+
+    async def run(self, func, *args):
+        if self.in_flight >= self.capacity:
+            raise HTTPException(
+                status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                detail='Server busy, try again later',
+                headers={'Retry-After': '1'},
+            )
+
+        with self._lock:
+            self.in_flight += 1
+        # Released when the job itself finishes: a cancelled caller
+        # doesn't stop a hash that is already running.
+        job = self._executor.submit(func, *args)
+        job.add_done_callback(self._release)
+        return await asyncio.wrap_future(job)
+
+    def _release(self, job):
+        with self._lock:
+            self.in_flight -= 1
+
+
+hashing_pool = HashingPool(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_size=settings.PASSWORD_HASH_QUEUE_SIZE,
+)
+
+
+@cache
+def password_hasher():
+    """The Argon2 hasher, loaded on first use to keep it off startup.
+
+    Hashes made with other parameters still verify and are upgraded to
+    these on the next successful login.
+    """
+    from pwdlib import PasswordHash  # noqa: PLC0415
+    from pwdlib.hashers.argon2 import Argon2Hasher  # noqa: PLC0415
+
+    return PasswordHash((
+        Argon2Hasher(
+            time_cost=settings.ARGON2_TIME_COST,
+            memory_cost=settings.ARGON2_MEMORY_COST_KIB,
+            parallelism=settings.ARGON2_PARALLELISM,
+        ),
+    ))
 
 
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
+    with PASSWORD_HASH_SECONDS.labels(operation='hash').time():
+        return password_hasher().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+    with PASSWORD_HASH_SECONDS.labels(operation='verify').time():
+        return password_hasher().verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    """Verify like `verify_password`, plus a new hash when outdated.
+
+    Returns `(valid, new_hash)`; `new_hash` is None unless the password
+    is valid and `hashed_password` was made with other parameters.
+    """
+    with PASSWORD_HASH_SECONDS.labels(operation='verify').time():
+        return password_hasher().verify_and_update(
+            plain_password, hashed_password
+        )
+
+
+async def get_password_hash_async(password: str):
+    return await hashing_pool.run(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    return await hashing_pool.run(
+        verify_password, plain_password, hashed_password
+    )
+
+
+@cache
+def _dummy_password_hash():
+    return password_hasher().hash('unknown user')
+
+
+def _verify_unknown_user(plain_password: str):
+    verify_password(plain_password, _dummy_password_hash())
+    return False, None
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+):
+    return await hashing_pool.run(
+        verify_and_update_password, plain_password, hashed_password
+    )
+
+
+async def verify_unknown_user_async(plain_password: str):
+    """Spend a real verification on a login for an unknown email.
+
+    Unknown emails then take as long as wrong passwords, so response
+    times don't reveal which accounts exist. Always `(False, None)`.
+    """
+    return await hashing_pool.run(_verify_unknown_user, plain_password)
 
 
 def create_access_token(data: dict):
@@ -32,7 +175,8 @@ def create_access_token(data: dict):
     expire = datetime.now(tz=ZoneInfo('UTC')) + timedelta(
         minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
     )
-    to_encode.update({'exp': expire})
+    # A float, so tokens issued in the second of a revocation still pass.
+    to_encode.update({'exp': expire, 'iat': time()})
 
     encoded_jwt = encode(
         to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
@@ -41,33 +185,164 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
+def token_claims(user) -> dict:
+    """Claims identifying `user` well enough to skip the DB lookup."""
+    return {
+        'sub': user.email,
+        'uid': user.id,
+        'name': user.username,
+    }
+
+
+def revoke_tokens(user_id: int):
+    """Reject `user_id`'s tokens issued until now, in this process."""
+    tokens_revoked_at[user_id] = time()
+
+
+def _check_not_revoked(payload: dict, user_id: int):
+    if payload.get('iat', 0) < tokens_revoked_at.get(user_id, 0):
+        JWT_DECODE_FAILURES.labels(reason='revoked').inc()
+        raise credentials_exception
+
+
+def decode_token(token: str) -> dict:
+    payload = token_cache.get(token)
+
+    if payload is None:
+        payload = decode(
+            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+        )
+        token_cache.set(token, payload)
+    elif payload['exp'] <= time():
+        raise ExpiredSignatureError('Signature has expired')
+
+    return payload
+
+
+def _verified_payload(token: str) -> dict:
+    """Decode `token`, rejecting it with 401 unless it names a subject."""
+    try:
+        payload = decode_token(token)
+    except ExpiredSignatureError:
+        JWT_DECODE_FAILURES.labels(reason='expired').inc()
+        raise credentials_exception
+    except InvalidTokenError:
+        JWT_DECODE_FAILURES.labels(reason='invalid').inc()
+        raise credentials_exception
+
+    if not payload.get('sub'):
+        JWT_DECODE_FAILURES.labels(reason='missing_subject').inc()
+        raise credentials_exception
+
+    return payload
+
+
 async def get_current_user(
     session: AsyncSession = Depends(get_session),
     token: str = Depends(oauth2_scheme),
-):
-    credentials_exception = HTTPException(
-        status_code=HTTPStatus.UNAUTHORIZED,
-        detail='Could not validate credentials',
-        headers={'WWW-Authenticate': 'Bearer'},
-    )
+) -> UserPrincipal:
+    """Resolve the token subject to a slim principal.
 
-    try:
-        payload = decode(
-            token, settings.SECRET_KEY, algorithms=settings.ALGORITHM
+    Only the columns every endpoint needs are selected, so resolving the
+    caller is a single indexed lookup no matter how many todos they own.
+    It always reads the primary, so new and just-updated users resolve.
+    Endpoints that need the mapped entity opt in with `load_current_user`.
+    Resolved principals are kept in `principal_cache`, keyed by subject;
+    writes to the user row must call `invalidate_principal`.
+    """
+    payload = _verified_payload(token)
+    subject_email = payload['sub']
+
+    principal = principal_cache.get(subject_email)
+    if principal:
+        _check_not_revoked(payload, principal.id)
+        return principal
+
+    row = (
+        await session.execute(
+            select(User.id, User.username, User.email).where(
+                User.email == subject_email
+            )
         )
-        subject_email = payload.get('sub')
-        if not subject_email:
-            raise credentials_exception
-    except DecodeError:
-        raise credentials_exception
-    except ExpiredSignatureError:
+    ).one_or_none()
+
+    if not row:
         raise credentials_exception
 
-    user = await session.scalar(
-        select(User).where(User.email == subject_email)
+    principal = UserPrincipal.model_validate(row)
+    _check_not_revoked(payload, principal.id)
+    principal_cache.set(subject_email, principal)
+
+    return principal
+
+
+async def get_reader(
+    session: AsyncSession = Depends(get_session),
+    token: str = Depends(oauth2_scheme),
+) -> UserPrincipal:
+    """The caller of a read-only endpoint.
+
+    With `STATELESS_TOKENS` the principal is read from the token claims
+    and the DB is not queried at all; writes that change those claims
+    must call `revoke_tokens`. Revocation only reaches this process, so
+    endpoints that write must use `get_current_user` instead.
+    """
+    payload = _verified_payload(token)
+
+    user_id = payload.get('uid')
+    if not (
+        settings.STATELESS_TOKENS and user_id is not None and 'name' in payload
+    ):
+        return await get_current_user(session, token)
+
+    _check_not_revoked(payload, user_id)
+
+    return UserPrincipal(
+        id=user_id, username=payload['name'], email=payload['sub']
     )
 
-    if not user:
-        raise credentials_exception
 
-    return user
+async def get_read_session(
+    session: AsyncSession = Depends(get_session),
+    token: str | None = Depends(optional_oauth2_scheme),
+):
+    """Session for read-only handlers, on a replica when one is set up.
+
+    Read-your-writes stickiness follows the user the token belongs to,
+    across all their tokens; anonymous reads always go to a replica.
+    """
+    user_id = None
+    if token:
+        with suppress(InvalidTokenError):
+            user_id = decode_token(token).get('uid')
+
+    async with read_session(session, user_id) as reads:
+        yield reads
+
+
+def invalidate_principal(*subjects: str):
+    for subject in subjects:
+        principal_cache.pop(subject)
+
+
+def load_current_user(*options):
+    """Build a dependency returning the caller as a mapped `User`.
+
+    `options` are loader options (e.g. `selectinload(User.todos)`) applied
+    only for the endpoints that ask for them.
+    """
+
+    async def dependency(
+        principal: UserPrincipal = Depends(get_current_user),
+        session: AsyncSession = Depends(get_session),
+    ) -> User:
+        user = await session.scalar(
+            select(User).where(User.id == principal.id).options(*options)
+        )
+
+        if not user:
+            raise credentials_exception
+
+        return user
+
+    return dependency
@@ -1,3 +1,6 @@
+from functools import cache
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,6 +11,59 @@ class Settings(BaseSettings):
     )
 
     DATABASE_URL: str
+    DATABASE_REPLICA_URLS: list[str] = []
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+
+    PRINCIPAL_CACHE_SIZE: int = 1024
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30
+    TOKEN_CACHE_SIZE: int = 4096
+    STATELESS_TOKENS: bool = False
+
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST_KIB: int = 65536
+    ARGON2_PARALLELISM: int = 4
+
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 32
+
+    LOGIN_IP_RATE_PER_MINUTE: float = 60
+    LOGIN_IP_BURST: int = 20
+    LOGIN_ACCOUNT_RATE_PER_MINUTE: float = 10
+    LOGIN_ACCOUNT_BURST: int = 5
+    LOGIN_MAX_CONCURRENT_VERIFICATIONS: int = 8
+
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+    DB_PREPARE_THRESHOLD: int | None = 5
+    DB_REPLICA_STICKY_SECONDS: float = 5
+    # Use 'redis' (at REDIS_URL) with several workers, so every worker
+    # knows who just wrote.
+    DB_REPLICA_STICKY_BACKEND: Literal['memory', 'redis'] = 'memory'
+
+    BULK_INSERT_BATCH_SIZE: int = 1000
+    EXPORT_FETCH_SIZE: int = 1000
+
+    SLOW_QUERY_THRESHOLD_MS: float = 200
+
+    FAST_JSON_RESPONSES: bool = False
+
+    EVENTS_BACKEND: Literal['memory', 'postgres'] = 'memory'
+    EVENTS_QUEUE_SIZE: int = 100
+    EVENTS_HEARTBEAT_SECONDS: float = 15
+
+    RESPONSE_CACHE_BACKEND: Literal['none', 'memory', 'redis'] = 'none'
+    RESPONSE_CACHE_SIZE: int = 4096
+    RESPONSE_CACHE_TTL_SECONDS: float = 30
+    REDIS_URL: str = 'redis://localhost:6379/0'
+
+
+@cache
+def get_settings() -> Settings:
+    """The process-wide settings, parsed from the environment once."""
+    return Settings()
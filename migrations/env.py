@@ -6,12 +6,12 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from alembic import context
 from fastapi_zero.models import table_registry
-from fastapi_zero.settings import Settings
+from fastapi_zero.settings import get_settings
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
-config.set_main_option('sqlalchemy.url', Settings().DATABASE_URL)
+config.set_main_option('sqlalchemy.url', get_settings().DATABASE_URL)
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -75,11 +75,27 @@ def run_migrations_offline() -> None:
 #         with context.begin_transaction():
 #             context.run_migrations()
 
+# Dialect-specific indexes (declared with `ddl_if`) only exist on some
+# backends, so their migrations are written by hand and autogenerate must
+# neither add them nor report the reflected index as removed.
+dialect_indexes = {
+    index.name
+    for table in target_metadata.tables.values()
+    for index in table.indexes
+    if 'dialect' in index.info
+}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return not (type_ == "index" and name in dialect_indexes)
+
+
 def do_run_migrations(connection):
     context.configure(
         connection=connection,
         target_metadata=target_metadata,
         compare_type=True,  # Enable type comparison for autogenerate
+        include_object=include_object,
     )
 
     with context.begin_transaction():
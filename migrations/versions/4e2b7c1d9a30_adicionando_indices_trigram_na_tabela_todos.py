@@ -0,0 +1,57 @@
+"""Adicionando indices trigram na tabela <todos>
+
+Revision ID: 4e2b7c1d9a30
+Revises: 809699d903d2
+Create Date: 2026-10-18 18:42:10.532918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e2b7c1d9a30'
+down_revision: Union[str, None] = '809699d903d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _pg_trgm_available() -> bool:
+    # Os indices trigram so existem no PostgreSQL com o pg_trgm (contrib).
+    bind = op.get_bind()
+    return bind.dialect.name == 'postgresql' and bool(
+        bind.scalar(
+            sa.text(
+                "SELECT 1 FROM pg_available_extensions "
+                "WHERE name = 'pg_trgm'"
+            )
+        )
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _pg_trgm_available():
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in ('title', 'description'):
+        op.create_index(
+            f'ix_todos_{column}_trgm',
+            'todos',
+            [column],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={column: 'gin_trgm_ops'},
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if not _pg_trgm_available():
+        return
+
+    op.drop_index('ix_todos_description_trgm', table_name='todos')
+    op.drop_index('ix_todos_title_trgm', table_name='todos')
@@ -0,0 +1,46 @@
+"""Adicionando busca textual na tabela <todos>
+
+Revision ID: 7cb56f632b4d
+Revises: 35d843ee20e9
+Create Date: 2026-10-18 16:52:07.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7cb56f632b4d'
+down_revision: Union[str, None] = '35d843ee20e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # O indice GIN so existe no PostgreSQL; no SQLite a busca usa LIKE.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.create_index(
+        'ix_todos_search',
+        'todos',
+        [
+            sa.text(
+                "(setweight(to_tsvector('simple', title), 'A') || "
+                "setweight(to_tsvector('simple', description), 'B'))"
+            )
+        ],
+        unique=False,
+        postgresql_using='gin',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.drop_index('ix_todos_search', table_name='todos')
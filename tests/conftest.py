@@ -1,9 +1,11 @@
 from contextlib import contextmanager
 from datetime import datetime
+from functools import partial
 
 import factory
 import pytest
 import pytest_asyncio
+from fakeredis import FakeAsyncRedis
 from fastapi.testclient import TestClient
 from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
@@ -12,8 +14,19 @@ from testcontainers.postgres import PostgresContainer
 from fastapi_zero.app import app
 from fastapi_zero.database import get_session
 from fastapi_zero.models import User, table_registry
-from fastapi_zero.security import get_password_hash
-from fastapi_zero.settings import Settings
+from fastapi_zero.response_cache import (
+    MemoryBackend,
+    RedisBackend,
+    response_cache,
+)
+from fastapi_zero.routers.auth import login_account_bucket, login_ip_bucket
+from fastapi_zero.security import (
+    get_password_hash,
+    principal_cache,
+    token_cache,
+    tokens_revoked_at,
+)
+from fastapi_zero.settings import get_settings
 
 
 @pytest_asyncio.fixture
@@ -46,6 +59,27 @@ async def other_user(session: AsyncSession):
     return user
 
 
+@pytest.fixture(autouse=True)
+def clear_auth_caches():
+    yield
+    principal_cache.clear()
+    token_cache.clear()
+    tokens_revoked_at.clear()
+    login_ip_bucket.clear()
+    login_account_bucket.clear()
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def cache_backend(request, monkeypatch):
+    if request.param == 'memory':
+        backend = MemoryBackend(maxsize=16, ttl=60)
+    else:
+        backend = RedisBackend(FakeAsyncRedis(), ttl=60)
+
+    monkeypatch.setattr(response_cache, 'backend', backend)
+    return backend
+
+
 @pytest.fixture
 def client(session):
     def get_session_override():
@@ -65,7 +99,14 @@ def engine():
 
 
 @pytest_asyncio.fixture
-async def session(engine):
+async def session(request, engine, tmp_path):
+    # Parametrize with `indirect=True` and 'sqlite' to run a test on the
+    # SQLite setup from the README as well.
+    if getattr(request, 'param', 'postgresql') == 'sqlite':
+        engine = create_async_engine(
+            f'sqlite+aiosqlite:///{tmp_path / "db.sqlite"}'
+        )
+
     async with engine.begin() as conn:
         await conn.run_sync(table_registry.metadata.create_all)
 
@@ -74,6 +115,8 @@ async def session(engine):
 
     async with engine.begin() as conn:
         await conn.run_sync(table_registry.metadata.drop_all)
+    if engine.dialect.name == 'sqlite':
+        await engine.dispose()
 
 
 @pytest.fixture
@@ -105,9 +148,45 @@ def mock_db_time():
     return _mock_db_time
 
 
+@contextmanager
+def _count_queries(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(
+        engine.sync_engine, 'before_cursor_execute', before_cursor_execute
+    )
+
+    yield statements
+
+    event.remove(
+        engine.sync_engine, 'before_cursor_execute', before_cursor_execute
+    )
+
+
+@pytest.fixture
+def count_queries(engine):
+    return partial(_count_queries, engine)
+
+
+@contextmanager
+def _assert_queries(engine, expected):
+    with _count_queries(engine) as statements:
+        yield statements
+
+    assert len(statements) == expected, '\n'.join(statements)
+
+
+@pytest.fixture
+def assert_queries(engine):
+    return partial(_assert_queries, engine)
+
+
 @pytest.fixture
 def settings():
-    return Settings()
+    return get_settings()
 
 
 class UserFactory(factory.Factory):
@@ -1,5 +1,14 @@
+import json
+import logging
+import subprocess
+import sys
 from http import HTTPStatus
 
+from prometheus_client import REGISTRY
+
+from fastapi_zero import metrics
+from fastapi_zero.instrumentation import settings
+
 
 def test_read_root(client):
     response = client.get('/')
@@ -13,3 +22,144 @@ def test_exercicio_aula_02(client):
 
     assert response.status_code == HTTPStatus.OK
     assert '<h1> Olá Mundo, em formato HTML!</h1>' in response.text
+
+
+def test_server_timing_reports_queries(client, token):
+    response = client.get(
+        '/todos/', headers={'Authorization': f'Bearer {token}'}
+    )
+
+    # principal lookup + ETag validators + list query
+    assert 'desc="3 queries"' in response.headers['Server-Timing']
+
+
+def test_request_log_line(client, caplog):
+    with caplog.at_level(logging.INFO, logger='fastapi_zero.instrumentation'):
+        client.get('/users/1')
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record['path'] == '/users/1'
+    assert record['status'] == HTTPStatus.NOT_FOUND
+    assert record['queries'] == 1
+
+
+def test_slow_query_is_logged(client, caplog, monkeypatch):
+    monkeypatch.setattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 0)
+
+    with caplog.at_level(
+        logging.WARNING, logger='fastapi_zero.instrumentation'
+    ):
+        client.get('/users/1')
+
+    assert 'slow query' in caplog.text
+    assert 'FROM users' in caplog.text
+
+
+def test_metrics_exposes_route_latency(client):
+    client.get('/users/1')
+
+    response = client.get('/metrics')
+
+    assert response.status_code == HTTPStatus.OK
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/users/{user_id}",status="404"}'
+    ) in response.text
+    assert 'http_requests_in_flight' in response.text
+    assert 'principal_cache{stat="misses"}' in response.text
+
+
+def test_metrics_counts_jwt_failures(client):
+    before = REGISTRY.get_sample_value(
+        'jwt_decode_failures_total', {'reason': 'invalid'}
+    )
+
+    client.delete('/users/1', headers={'Authorization': 'Bearer invalid'})
+
+    after = REGISTRY.get_sample_value(
+        'jwt_decode_failures_total', {'reason': 'invalid'}
+    )
+    assert after == (before or 0) + 1
+
+
+def test_metrics_observes_password_hashing(client, user, token):
+    assert REGISTRY.get_sample_value(
+        'password_hash_duration_seconds_count', {'operation': 'verify'}
+    )
+
+
+def test_pool_totals_not_exported_as_gauges():
+    pool_size, wait_seconds_max = 5, 0.5
+    metrics.set_pool_stats({
+        'size': pool_size,
+        'checked_out': 2,
+        'overflow': 0,
+        'checkouts': 9,
+        'overflow_checkouts': 0,
+        'timeouts': 0,
+        'wait_seconds_total': 1.0,
+        'wait_seconds_max': wait_seconds_max,
+    })
+
+    assert REGISTRY.get_sample_value('db_pool', {'stat': 'size'}) == pool_size
+    assert REGISTRY.get_sample_value('db_pool', {'stat': 'checkouts'}) is None
+    assert (
+        REGISTRY.get_sample_value('db_pool_wait_seconds_max')
+        == wait_seconds_max
+    )
+
+
+def test_metrics_multiprocess_mode(monkeypatch, tmp_path):
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    # another worker, writing its samples to the shared directory
+    subprocess.run(
+        [
+            sys.executable,
+            '-c',
+            'from fastapi_zero.metrics import JWT_DECODE_FAILURES;'
+            "JWT_DECODE_FAILURES.labels(reason='expired').inc(3)",
+        ],
+        check=True,
+    )
+
+    assert (
+        b'jwt_decode_failures_total{reason="expired"} 3.0' in metrics.render()
+    )
+
+
+# Cumulative `python -X importtime` budget for `fastapi_zero.app`, about
+# twice what it takes today. Raise it only for a dependency worth it.
+IMPORT_TIME_BUDGET_MS = 1500
+# Loaded on first use, only by deployments that need them.
+LAZY_MODULES = ('redis', 'psycopg', 'aiosqlite', 'argon2')
+
+
+def _import_app(*args):
+    return subprocess.run(
+        [sys.executable, *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_app_import_time_within_budget():
+    result = _import_app('-X', 'importtime', '-c', 'import fastapi_zero.app')
+
+    # Lines read `import time: self [us] | cumulative [us] | module`.
+    cumulative_us = next(
+        int(line.split('|')[1])
+        for line in result.stderr.splitlines()
+        if line.endswith('| fastapi_zero.app')
+    )
+
+    assert cumulative_us / 1000 < IMPORT_TIME_BUDGET_MS
+
+
+def test_app_import_defers_drivers_and_hasher():
+    result = _import_app(
+        '-c',
+        'import sys, fastapi_zero.app; print(*sorted(sys.modules))',
+    )
+
+    assert not set(LAZY_MODULES) & set(result.stdout.split())
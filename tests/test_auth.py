@@ -1,6 +1,19 @@
 from http import HTTPStatus
 
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
 from freezegun import freeze_time
+from prometheus_client import REGISTRY
+from pwdlib.hashers.argon2 import Argon2Hasher
+from sqlalchemy import select
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+
+from fastapi_zero.app import app
+from fastapi_zero.models import User
+from fastapi_zero.ratelimit import ConcurrencyLimit, TokenBucket
+from fastapi_zero.routers import auth as auth_router
+from tests.test_todos import TodoFactory
 
 
 def test_get_token(client, user):
@@ -89,3 +102,171 @@ def test_token_expired_dont_refresh(client, user):
         )
         assert response.status_code == HTTPStatus.UNAUTHORIZED
         assert response.json() == {'detail': 'Could not validate credentials'}
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_does_not_load_todos(
+    session, client, user, token, count_queries
+):
+    session.add_all(TodoFactory.build_batch(500, user_id=user.id))
+    await session.commit()
+
+    with count_queries() as statements:
+        response = client.post(
+            '/auth/refresh_token',
+            headers={'Authorization': f'Bearer {token}'},
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    assert len(statements) == 1
+    assert 'todos' not in statements[0]
+
+
+def _login(client, email, password='wrong'):
+    return client.post(
+        '/auth/token', data={'username': email, 'password': password}
+    )
+
+
+def test_login_throttled_per_ip(client, user, other_user, monkeypatch):
+    monkeypatch.setattr(auth_router.login_ip_bucket, 'burst', 2)
+
+    _login(client, user.email)
+    _login(client, other_user.email)
+    response = _login(client, user.email, user.clean_password)
+
+    assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert int(response.headers['Retry-After']) >= 1
+
+
+@pytest.mark.usefixtures('client')
+def test_login_throttled_per_forwarded_client(user, monkeypatch):
+    monkeypatch.setattr(auth_router.login_ip_bucket, 'burst', 1)
+    # what uvicorn runs with `--forwarded-allow-ips`
+    proxied = TestClient(ProxyHeadersMiddleware(app, trusted_hosts='*'))
+
+    def login_from(ip):
+        return proxied.post(
+            '/auth/token',
+            data={'username': user.email, 'password': 'wrong'},
+            headers={'X-Forwarded-For': ip},
+        )
+
+    login_from('203.0.113.1')
+    other_client = login_from('203.0.113.2')
+    same_client = login_from('203.0.113.1')
+
+    assert other_client.status_code == HTTPStatus.UNAUTHORIZED
+    assert same_client.status_code == HTTPStatus.TOO_MANY_REQUESTS
+
+
+def test_login_throttled_per_account(client, user, other_user, monkeypatch):
+    monkeypatch.setattr(auth_router.login_account_bucket, 'burst', 2)
+
+    _login(client, user.email)
+    _login(client, user.email.upper())
+    throttled = _login(client, user.email, user.clean_password)
+    other = _login(client, other_user.email, other_user.clean_password)
+
+    assert throttled.status_code == HTTPStatus.TOO_MANY_REQUESTS
+    assert other.status_code == HTTPStatus.OK
+
+
+def test_login_unknown_email_still_verifies_a_password(client):
+    def verifications():
+        return REGISTRY.get_sample_value(
+            'password_hash_duration_seconds_count', {'operation': 'verify'}
+        )
+
+    before = verifications() or 0
+    response = _login(client, 'nobody@example.com')
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert response.json() == {'detail': 'Incorrect email or password'}
+    assert verifications() == before + 1
+
+
+def test_login_shed_when_verifications_are_saturated(
+    client, user, monkeypatch
+):
+    monkeypatch.setattr(auth_router.login_verifications, 'in_flight', 8)
+    monkeypatch.setattr(auth_router.login_verifications, 'limit', 8)
+
+    response = _login(client, user.email, user.clean_password)
+
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(rate=1, burst=1)
+
+    with freeze_time('2024-01-01 12:00:00') as frozen:
+        assert bucket.acquire('key') == 0
+        assert bucket.acquire('key') > 0
+        frozen.tick(1)
+        assert bucket.acquire('key') == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_releases_slot():
+    limit = ConcurrencyLimit(1)
+
+    async with limit.slot():
+        with pytest.raises(HTTPException) as exc_info:
+            async with limit.slot():
+                pass
+
+    async with limit.slot():
+        assert limit.in_flight == 1
+
+    assert exc_info.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+
+
+@pytest.mark.asyncio
+async def test_login_upgrades_outdated_password_hash(
+    session, client, user, settings
+):
+    weak_hasher = Argon2Hasher(time_cost=1, memory_cost=8192, parallelism=1)
+    user.password = weak_hasher.hash(user.clean_password)
+    await session.commit()
+
+    response = _login(client, user.email, user.clean_password)
+    stored = await session.scalar(
+        select(User.password).where(User.id == user.id)
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert (
+        f'm={settings.ARGON2_MEMORY_COST_KIB},'
+        f't={settings.ARGON2_TIME_COST},'
+        f'p={settings.ARGON2_PARALLELISM}'
+    ) in stored
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('cache_backend')
+async def test_login_hash_upgrade_invalidates_response_cache(
+    session, client, user
+):
+    weak_hasher = Argon2Hasher(time_cost=1, memory_cost=8192, parallelism=1)
+    user.password = weak_hasher.hash(user.clean_password)
+    await session.commit()
+    cached = client.get(f'/users/{user.id}')
+
+    _login(client, user.email, user.clean_password)
+    response = client.get(f'/users/{user.id}')
+
+    assert response.headers['ETag'] != cached.headers['ETag']
+
+
+@pytest.mark.asyncio
+async def test_login_keeps_current_password_hash(session, client, user):
+    stored = user.password
+
+    response = _login(client, user.email, user.clean_password)
+
+    assert response.status_code == HTTPStatus.OK
+    assert (
+        await session.scalar(select(User.password).where(User.id == user.id))
+        == stored
+    )
@@ -1,10 +1,23 @@
 from http import HTTPStatus
 
 import pytest
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+import pytest_asyncio
+from fakeredis import FakeAsyncRedis
+from prometheus_client import REGISTRY
+from sqlalchemy import exc, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 
-from fastapi_zero.models import User
+from fastapi_zero import database
+from fastapi_zero.database import (
+    InstrumentedQueuePool,
+    MemoryWriteLog,
+    RedisWriteLog,
+    ReplicaRouter,
+    engine_options,
+)
+from fastapi_zero.models import Todo, TodoState, User, table_registry
+from fastapi_zero.search import search_todos
+from fastapi_zero.security import create_access_token, token_claims
 
 
 @pytest.mark.asyncio
@@ -29,6 +42,272 @@ async def test_create_user(session: AsyncSession):
     # }
 
 
+async def _explain(
+    session: AsyncSession,
+    query,
+    disable=('enable_seqscan', 'enable_bitmapscan', 'enable_sort'),
+):
+    compiled = query.compile(
+        session.bind, compile_kwargs={'literal_binds': True}
+    )
+    # an empty table is always cheapest to scan, so only allow plans that
+    # walk an index in order
+    for setting in disable:
+        await session.execute(text(f'SET LOCAL {setting} = off'))
+    plan = await session.scalars(text(f'EXPLAIN {compiled}'))
+    await session.rollback()
+
+    return '\n'.join(plan)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ('query', 'index'),
+    [
+        (
+            select(Todo).where(Todo.user_id == 1).order_by(Todo.id).limit(100),
+            'ix_todos_user_id_id',
+        ),
+        (
+            select(Todo)
+            .where(Todo.user_id == 1, Todo.state == TodoState.done)
+            .order_by(Todo.id)
+            .limit(100),
+            'ix_todos_user_id_state_id',
+        ),
+    ],
+)
+async def test_todos_queries_use_indexes(session, query, index):
+    plan = await _explain(session, query)
+
+    assert index in plan
+
+
+@pytest.mark.asyncio
+async def test_todos_search_uses_index(session):
+    query = search_todos(select(Todo), 'milk', 'postgresql')
+
+    plan = await _explain(session, query, disable=('enable_seqscan',))
+
+    assert 'ix_todos_search' in plan
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('column', ['title', 'description'])
+async def test_todos_substring_filters_use_trigram_index(session, column):
+    installed = await session.scalar(
+        text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    )
+    if not installed:
+        pytest.skip('pg_trgm is not available on this server')
+    # the `title=` and `description=` filters of `GET /todos/`
+    query = select(Todo).where(getattr(Todo, column).contains('milk'))
+
+    plan = await _explain(session, query, disable=('enable_seqscan',))
+
+    assert f'ix_todos_{column}_trgm' in plan
+
+
+def test_engine_options_for_postgres(settings):
+    settings = settings.model_copy(
+        update={
+            'DATABASE_URL': 'postgresql+psycopg://app@localhost/app',
+            'DB_STATEMENT_TIMEOUT_MS': 500,
+        }
+    )
+
+    options = engine_options(settings)
+
+    assert options['poolclass'] is InstrumentedQueuePool
+    assert options['pool_size'] == settings.DB_POOL_SIZE
+    assert options['connect_args'] == {
+        'prepare_threshold': settings.DB_PREPARE_THRESHOLD,
+        'options': '-c statement_timeout=500',
+    }
+
+
+def test_engine_options_for_sqlite(settings):
+    settings = settings.model_copy(
+        update={'DATABASE_URL': 'sqlite+aiosqlite:///database.db'}
+    )
+
+    assert engine_options(settings) == {}
+
+
+def _sample(name):
+    return REGISTRY.get_sample_value(name) or 0
+
+
+@pytest.mark.asyncio
+async def test_instrumented_pool_counts_exhaustion(engine):
+    expected_connections = 2
+    pool_timeout = 0.1
+    small_engine = create_async_engine(
+        engine.url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=1,
+        pool_timeout=pool_timeout,
+    )
+
+    timeouts_before = _sample('db_pool_timeouts_total')
+    checkouts_before = _sample('db_pool_checkouts_total')
+
+    async with small_engine.connect(), small_engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            await small_engine.connect().start()
+        stats = small_engine.pool.stats()
+
+    await small_engine.dispose()
+
+    assert _sample('db_pool_timeouts_total') == timeouts_before + 1
+    assert (
+        _sample('db_pool_checkouts_total')
+        == checkouts_before + expected_connections
+    )
+
+    assert stats['checked_out'] == expected_connections
+    assert stats['checkouts'] == expected_connections
+    assert stats['overflow_checkouts'] == 1
+    assert stats['timeouts'] == 1
+    assert stats['wait_seconds_max'] >= pool_timeout
+
+
+@pytest.mark.asyncio
+async def test_replica_router_round_robin_and_stickiness():
+    replicas = ReplicaRouter(['a', 'b'], MemoryWriteLog(ttl=60))
+
+    assert [await replicas.pick(None) for _ in range(3)] == ['a', 'b', 'a']
+
+    await replicas.mark_write(1)
+
+    assert await replicas.pick(1) is None
+    assert await replicas.pick(2) == 'b'
+    assert await replicas.pick(None) == 'a'
+    assert await ReplicaRouter([], MemoryWriteLog(ttl=60)).pick(1) is None
+
+
+@pytest.mark.asyncio
+async def test_replica_stickiness_shared_across_workers():
+    client = FakeAsyncRedis()
+    worker_a = ReplicaRouter(['a'], RedisWriteLog(client, ttl=60))
+    worker_b = ReplicaRouter(['a'], RedisWriteLog(client, ttl=60))
+
+    await worker_a.mark_write(1)
+
+    assert await worker_b.pick(1) is None
+    assert await worker_b.pick(2) == 'a'
+
+
+@pytest_asyncio.fixture
+async def replica(tmp_path, monkeypatch, user):
+    """A SQLite replica that only has `user`, never the todos."""
+    url = f'sqlite+aiosqlite:///{tmp_path / "replica.db"}'
+    monkeypatch.setattr(database.settings, 'DATABASE_REPLICA_URLS', [url])
+    database.get_replicas.cache_clear()
+    replicas = database.get_replicas()
+    [replica_engine] = replicas.engines
+
+    async with replica_engine.begin() as conn:
+        await conn.run_sync(table_registry.metadata.create_all)
+        await conn.execute(
+            insert(User).values(
+                id=user.id,
+                username=user.username,
+                email=user.email,
+                password=user.password,
+            )
+        )
+
+    yield replicas
+
+    await replica_engine.dispose()
+    database.get_replicas.cache_clear()
+
+
+def test_reads_use_replica_except_right_after_a_write(client, token, replica):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client.post(
+        '/todos/',
+        headers=headers,
+        json={'title': 'Test', 'description': 'Test', 'state': 'draft'},
+    )
+    from_primary = client.get('/todos/', headers=headers)
+
+    replica.writes.clear()
+    from_replica = client.get('/todos/', headers=headers)
+
+    assert [todo['title'] for todo in from_primary.json()['todos']] == ['Test']
+    assert from_replica.json()['todos'] == []
+
+
+def test_reads_stick_to_primary_for_all_of_a_users_tokens(
+    client, user, token, replica
+):
+    other_token = create_access_token({**token_claims(user), 'device': 2})
+
+    client.post(
+        '/todos/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'Test', 'description': 'Test', 'state': 'draft'},
+    )
+    response = client.get(
+        '/todos/', headers={'Authorization': f'Bearer {other_token}'}
+    )
+
+    assert [todo['title'] for todo in response.json()['todos']] == ['Test']
+
+
+@pytest.mark.usefixtures('cache_backend')
+@pytest.mark.asyncio
+async def test_lagging_replica_reads_are_not_cached(
+    client, user, token, replica
+):
+    old_username = user.username
+    client.put(
+        f'/users/{user.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'username': 'bob', 'email': user.email, 'password': 'secret'},
+    )
+    # Anonymous, so served by the replica that hasn't seen the update.
+    lagging = client.get(f'/users/{user.id}')
+
+    [replica_engine] = replica.engines
+    async with replica_engine.begin() as conn:
+        await conn.execute(
+            update(User).where(User.id == user.id).values(username='bob')
+        )
+    caught_up = client.get(f'/users/{user.id}')
+
+    assert lagging.json()['username'] == old_username
+    assert caught_up.json()['username'] == 'bob'
+
+
+@pytest.mark.usefixtures('cache_backend')
+@pytest.mark.asyncio
+async def test_replica_reads_not_cached_with_per_process_write_log(
+    client, user, token, replica
+):
+    client.put(
+        f'/users/{user.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'username': 'bob', 'email': user.email, 'password': 'secret'},
+    )
+    # as if the update was served by another worker
+    replica.writes.clear()
+    client.get(f'/users/{user.id}')
+
+    [replica_engine] = replica.engines
+    async with replica_engine.begin() as conn:
+        await conn.execute(
+            update(User).where(User.id == user.id).values(username='bob')
+        )
+    caught_up = client.get(f'/users/{user.id}')
+
+    assert caught_up.json()['username'] == 'bob'
+
+
 def test_get_user_should_return_not_found(client):
     response = client.get('/users/666')
 
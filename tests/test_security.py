@@ -1,8 +1,24 @@
+import asyncio
+import threading
 from http import HTTPStatus
+from time import time
 
+import pytest
+from fastapi import HTTPException
+from freezegun import freeze_time
 from jwt import decode
 
-from fastapi_zero.security import create_access_token
+from fastapi_zero import security
+from fastapi_zero.security import (
+    HashingPool,
+    create_access_token,
+    get_password_hash_async,
+    principal_cache,
+    revoke_tokens,
+    token_cache,
+    token_claims,
+    verify_password_async,
+)
 
 
 def test_jwt(settings):
@@ -22,3 +38,218 @@ def test_jwt_invalid_token(client):
 
     assert response.status_code == HTTPStatus.UNAUTHORIZED
     assert response.json() == {'detail': 'Could not validate credentials'}
+
+
+def test_current_user_is_cached(client, token, count_queries):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/auth/refresh_token', headers=headers)
+
+    with count_queries() as statements:
+        response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert statements == []
+    assert principal_cache.stats() == {'size': 1, 'hits': 1, 'misses': 1}
+
+
+def test_update_user_invalidates_cached_principal(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/auth/refresh_token', headers=headers)
+
+    response = client.put(
+        f'/users/{user.id}',
+        headers=headers,
+        json={
+            'username': 'bob',
+            'email': 'bob@example.com',
+            'password': 'secret',
+        },
+    )
+    assert response.status_code == HTTPStatus.OK
+
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_delete_user_invalidates_cached_principal(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/auth/refresh_token', headers=headers)
+
+    response = client.delete(f'/users/{user.id}', headers=headers)
+    assert response.status_code == HTTPStatus.OK
+
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_login_token_carries_principal_claims(settings, user, token):
+    claims = decode(token, settings.SECRET_KEY, algorithms=settings.ALGORITHM)
+
+    assert claims['uid'] == user.id
+    assert claims['name'] == user.username
+    assert claims['iat'] <= time()
+
+
+def test_stateless_tokens_skip_database_on_reads(
+    client, token, count_queries, monkeypatch
+):
+    monkeypatch.setattr(security.settings, 'STATELESS_TOKENS', True)
+
+    with count_queries() as statements:
+        response = client.get(
+            '/todos/stats', headers={'Authorization': f'Bearer {token}'}
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    assert not [s for s in statements if 'FROM users' in s]
+    assert len(principal_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_stateless_tokens_not_trusted_for_writes(
+    session, client, user, token, monkeypatch
+):
+    monkeypatch.setattr(security.settings, 'STATELESS_TOKENS', True)
+    # Deleted by another worker: this one never saw `revoke_tokens`.
+    await session.delete(user)
+    await session.commit()
+
+    response = client.post(
+        '/todos/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'title': 'Test', 'description': 'Test', 'state': 'draft'},
+    )
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_stateless_tokens_revoked_by_user_update(
+    client, user, token, monkeypatch
+):
+    monkeypatch.setattr(security.settings, 'STATELESS_TOKENS', True)
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client.put(
+        f'/users/{user.id}',
+        headers=headers,
+        json={'username': 'bob', 'email': user.email, 'password': 'secret'},
+    )
+    response = client.get('/todos/stats', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_stateless_tokens_issued_after_revocation_pass(
+    client, user, token, monkeypatch
+):
+    monkeypatch.setattr(security.settings, 'STATELESS_TOKENS', True)
+    revoke_tokens(user.id)
+    # issued later, maybe by a worker that never saw the revocation
+    new_token = create_access_token(token_claims(user))
+
+    old = client.get(
+        '/todos/stats', headers={'Authorization': f'Bearer {token}'}
+    )
+    new = client.get(
+        '/todos/stats', headers={'Authorization': f'Bearer {new_token}'}
+    )
+
+    assert old.status_code == HTTPStatus.UNAUTHORIZED
+    assert new.status_code == HTTPStatus.OK
+
+
+def test_revoked_token_cannot_be_refreshed(client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/auth/refresh_token', headers=headers)
+
+    client.put(
+        f'/users/{user.id}',
+        headers=headers,
+        json={'username': user.username, 'email': user.email, 'password': 'x'},
+    )
+    response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_stateless_tokens_accept_legacy_subject_only_tokens(
+    client, user, monkeypatch, count_queries
+):
+    monkeypatch.setattr(security.settings, 'STATELESS_TOKENS', True)
+    token = create_access_token(data={'sub': user.email})
+
+    with count_queries() as statements:
+        response = client.get(
+            '/todos/stats', headers={'Authorization': f'Bearer {token}'}
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    assert len([s for s in statements if 'FROM users' in s]) == 1
+
+
+def test_cached_token_still_expires(client, user):
+    with freeze_time('2023-01-01 12:00:00'):
+        token = create_access_token(data={'sub': user.email})
+    headers = {'Authorization': f'Bearer {token}'}
+
+    # Cached a few seconds before expiring, then used just after.
+    with freeze_time('2023-01-01 12:29:55'):
+        client.post('/auth/refresh_token', headers=headers)
+        assert token_cache.get(token)
+
+    with freeze_time('2023-01-01 12:30:05'):
+        assert token_cache.get(token)
+        response = client.post('/auth/refresh_token', headers=headers)
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_password_hash_async_roundtrip():
+    hashed = await get_password_hash_async('secret')
+
+    assert await verify_password_async('secret', hashed)
+    assert not await verify_password_async('wrong', hashed)
+
+
+@pytest.mark.asyncio
+async def test_hashing_pool_sheds_when_full():
+    pool = HashingPool(workers=1, queue_size=0)
+    release = threading.Event()
+    busy = asyncio.create_task(pool.run(release.wait))
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await pool.run(str, 'never runs')
+
+    release.set()
+    await busy
+
+    assert exc_info.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert pool.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_hashing_pool_counts_cancelled_jobs_until_they_finish():
+    pool = HashingPool(workers=1, queue_size=0)
+    started, release = threading.Event(), threading.Event()
+
+    def job():
+        started.set()
+        release.wait()
+
+    caller = asyncio.create_task(pool.run(job))
+    await asyncio.to_thread(started.wait)
+    caller.cancel()
+    await asyncio.gather(caller, return_exceptions=True)
+
+    # the hash is still running on the worker, so the pool stays full
+    with pytest.raises(HTTPException):
+        await pool.run(str, 'never runs')
+
+    release.set()
+    await asyncio.to_thread(pool._executor.shutdown)
+
+    assert pool.in_flight == 0
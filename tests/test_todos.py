@@ -1,10 +1,30 @@
+import asyncio
+import csv
+import io
+import json
 from http import HTTPStatus
 
 import factory
 import factory.fuzzy
 import pytest
+from fastapi import status
+from fastapi.websockets import WebSocketDisconnect
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import REGISTRY
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastapi_zero.models import Todo, TodoState  # , User
+from fastapi_zero import events
+from fastapi_zero.app import app
+from fastapi_zero.counters import repair_all_todo_counts, todo_counts
+from fastapi_zero.database import get_session
+from fastapi_zero.events import TodoBroker, broker, publish
+from fastapi_zero.models import Todo, TodoState, User
+from fastapi_zero.response_cache import MemoryBackend
+from fastapi_zero.routers import todos as todos_router
+from fastapi_zero.schemas import TodoPublic
+from fastapi_zero.search import search_todos
+from fastapi_zero.security import create_access_token
 
 
 class TodoFactory(factory.Factory):
@@ -33,8 +53,9 @@ class TodoFactory(factory.Factory):
 #         await session.scalar(select(Todo))
 
 
-def test_create_todo(client, token, mock_db_time):
-    with mock_db_time(model=Todo) as time:
+def test_create_todo(client, token, mock_db_time, assert_queries):
+    # principal lookup + INSERT ... RETURNING + version bump + counts
+    with mock_db_time(model=Todo) as time, assert_queries(4):
         response = client.post(
             '/todos/',
             headers={'Authorization': f'Bearer {token}'},
@@ -54,6 +75,83 @@ def test_create_todo(client, token, mock_db_time):
     }
 
 
+def test_create_todos_bulk(client, token, count_queries):
+    todos = [
+        {'title': f'Todo {n}', 'description': 'bulk', 'state': 'todo'}
+        for n in range(3)
+    ]
+
+    with count_queries() as statements:
+        response = client.post(
+            '/todos/bulk',
+            headers={'Authorization': f'Bearer {token}'},
+            json=todos,
+        )
+
+    inserts = [s for s in statements if s.startswith('INSERT INTO todos')]
+    assert response.status_code == HTTPStatus.OK
+    assert [todo['title'] for todo in response.json()['todos']] == [
+        'Todo 0',
+        'Todo 1',
+        'Todo 2',
+    ]
+    assert len(inserts) == 1
+
+
+def test_create_todos_bulk_reports_invalid_items(client, token):
+    response = client.post(
+        '/todos/bulk',
+        headers={'Authorization': f'Bearer {token}'},
+        json=[
+            {'title': 'Ok', 'description': 'fine'},
+            {'title': 'Bad', 'description': 'state', 'state': 'nope'},
+        ],
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert [error['loc'] for error in response.json()['detail']] == [
+        ['body', 1, 'state']
+    ]
+
+
+def test_create_todos_ndjson(client, token):
+    body = '\n'.join(
+        f'{{"title": "Todo {n}", "description": "stream"}}' for n in range(3)
+    )
+
+    response = client.post(
+        '/todos/bulk/ndjson',
+        headers={
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/x-ndjson',
+        },
+        content=body,
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert [todo['id'] for todo in response.json()['todos']] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_create_todos_ndjson_rolls_back_invalid_stream(
+    session, client, token
+):
+    body = '{"title": "Ok", "description": "fine"}\n\n{"title": "Bad"}\n'
+
+    response = client.post(
+        '/todos/bulk/ndjson',
+        headers={
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/x-ndjson',
+        },
+        content=body,
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert response.json()['detail'][0]['loc'] == ['body', 3, 'description']
+    assert (await session.scalars(select(Todo))).all() == []
+
+
 @pytest.mark.asyncio
 async def test_list_todos_should_return_all_expected_fields__exercicio(
     session, client, user, token, mock_db_time
@@ -81,6 +179,248 @@ async def test_list_todos_should_return_all_expected_fields__exercicio(
     ]
 
 
+@pytest.mark.asyncio
+async def test_list_todos_fast_json_matches_default(
+    session, client, user, token, monkeypatch
+):
+    session.add_all(TodoFactory.build_batch(3, user_id=user.id))
+    await session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    default = client.get('/todos/?limit=2', headers=headers).json()
+    monkeypatch.setattr(todos_router.settings, 'FAST_JSON_RESPONSES', True)
+    fast = client.get('/todos/?limit=2', headers=headers).json()
+
+    assert fast == default
+
+
+@pytest.mark.asyncio
+async def test_list_todos_selects_only_public_columns(
+    session, client, user, token, count_queries
+):
+    session.add_all(TodoFactory.build_batch(3, user_id=user.id))
+    await session.commit()
+
+    with count_queries() as statements:
+        response = client.get(
+            '/todos/', headers={'Authorization': f'Bearer {token}'}
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    select_list = statements[-1].split('FROM')[0]
+    assert 'todos.title' in select_list
+    assert 'todos.user_id' not in select_list
+
+
+@pytest.mark.asyncio
+async def test_list_todos_not_modified(session, client, user, token):
+    session.add_all(TodoFactory.build_batch(3, user_id=user.id))
+    await session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.get('/todos/', headers=headers)
+    etag = response.headers['ETag']
+    assert 'Last-Modified' in response.headers
+
+    cached = client.get('/todos/', headers={**headers, 'If-None-Match': etag})
+
+    assert cached.status_code == HTTPStatus.NOT_MODIFIED
+    assert cached.headers['ETag'] == etag
+    assert not cached.content
+
+
+@pytest.mark.asyncio
+async def test_list_todos_etag_changes_after_write(
+    session, client, user, token
+):
+    session.add_all(TodoFactory.build_batch(3, user_id=user.id))
+    await session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get('/todos/', headers=headers).headers['ETag']
+
+    client.post(
+        '/todos/',
+        headers=headers,
+        json={'title': 'new', 'description': 'new', 'state': 'todo'},
+    )
+    response = client.get(
+        '/todos/', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['ETag'] != etag
+
+
+@pytest.mark.asyncio
+async def test_list_todos_etag_depends_on_query(session, client, user, token):
+    session.add_all(TodoFactory.build_batch(3, user_id=user.id))
+    await session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get('/todos/', headers=headers).headers['ETag']
+
+    response = client.get(
+        '/todos/?limit=1', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.asyncio
+async def test_list_todos_if_modified_since(session, client, user, token):
+    session.add_all(TodoFactory.build_batch(3, user_id=user.id))
+    await session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+    last_modified = client.get('/todos/', headers=headers).headers[
+        'Last-Modified'
+    ]
+
+    response = client.get(
+        '/todos/', headers={**headers, 'If-Modified-Since': last_modified}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('cache_backend')
+async def test_list_todos_served_from_response_cache(
+    session, client, user, token, count_queries
+):
+    session.add_all(TodoFactory.build_batch(3, user_id=user.id))
+    await session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+    hits_before = _cache_hits('/todos/')
+
+    first = client.get('/todos/?limit=2', headers=headers)
+    with count_queries() as statements:
+        second = client.get('/todos/?limit=2', headers=headers)
+
+    assert second.json() == first.json()
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert statements == []
+    assert _cache_hits('/todos/') == hits_before + 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('cache_backend')
+async def test_response_cache_keys_on_query(session, client, user, token):
+    session.add_all(TodoFactory.build_batch(3, user_id=user.id))
+    await session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+    expected_todos = 2
+
+    client.get('/todos/?limit=1', headers=headers)
+    response = client.get('/todos/?limit=2', headers=headers)
+
+    assert len(response.json()['todos']) == expected_todos
+
+
+@pytest.mark.usefixtures('cache_backend')
+def test_todo_writes_invalidate_response_cache(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    todo = {'title': 'title', 'description': 'description', 'state': 'todo'}
+    client.get('/todos/', headers=headers)
+
+    client.post('/todos/', headers=headers, json=todo)
+    created = client.get('/todos/', headers=headers).json()['todos']
+    client.patch('/todos/?title=title', headers=headers, json={'title': 'x'})
+    patched = client.get('/todos/', headers=headers).json()['todos']
+
+    assert len(created) == 1
+    assert patched[0]['title'] == 'x'
+
+
+@pytest.mark.usefixtures('cache_backend')
+def test_cached_list_todos_not_modified(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    etag = client.get('/todos/', headers=headers).headers['ETag']
+
+    response = client.get(
+        '/todos/', headers={**headers, 'If-None-Match': etag}
+    )
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_never_reuses_forgotten_generations():
+    backend = MemoryBackend(maxsize=1, ttl=60)
+    seen = {await backend.generation('todos:1')}
+    await backend.bump('todos:1')
+    seen.add(await backend.generation('todos:1'))
+
+    # the only generation slot now goes to another scope
+    await backend.generation('todos:2')
+
+    assert await backend.generation('todos:1') not in seen
+
+
+@pytest.mark.asyncio
+async def test_export_todos_ndjson(session, client, user, token, monkeypatch):
+    monkeypatch.setattr(todos_router.settings, 'EXPORT_FETCH_SIZE', 2)
+    session.add_all(TodoFactory.build_batch(5, user_id=user.id))
+    await session.commit()
+    expected_todos = 5
+
+    response = client.get(
+        '/todos/export', headers={'Authorization': f'Bearer {token}'}
+    )
+    todos = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert len(todos) == expected_todos
+    assert [todo['id'] for todo in todos] == sorted(t['id'] for t in todos)
+    assert set(todos[0]) == set(TodoPublic.model_fields)
+
+
+@pytest.mark.asyncio
+async def test_export_todos_csv_applies_filters(
+    session, client, user, other_user, token
+):
+    session.add_all(
+        TodoFactory.build_batch(3, user_id=user.id, state=TodoState.done)
+    )
+    session.add_all(
+        TodoFactory.build_batch(2, user_id=user.id, state=TodoState.draft)
+    )
+    session.add_all(
+        TodoFactory.build_batch(2, user_id=other_user.id, state=TodoState.done)
+    )
+    await session.commit()
+    expected_todos = 3
+
+    response = client.get(
+        '/todos/export?format=csv&state=done',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    header, *rows = list(csv.reader(io.StringIO(response.text)))
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers['content-type'].startswith('text/csv')
+    assert header == [
+        'id',
+        'title',
+        'description',
+        'state',
+        'created_at',
+        'updated_at',
+    ]
+    assert len(rows) == expected_todos
+    assert {row[3] for row in rows} == {'done'}
+
+
+def test_export_todos_empty_csv_has_header(client, token):
+    response = client.get(
+        '/todos/export?format=csv',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.text.splitlines() == [
+        'id,title,description,state,created_at,updated_at'
+    ]
+
+
 @pytest.mark.asyncio
 async def test_list_todos_should_return_5_todos(session, client, user, token):
     expected_todos = 5
@@ -109,6 +449,86 @@ async def test_list_todos_should_return_2_todos(session, client, user, token):
     assert len(response.json()['todos']) == expected_todos
 
 
+@pytest.mark.asyncio
+async def test_list_todos_with_cursor(session, client, user, token):
+    session.add_all(TodoFactory.build_batch(5, user_id=user.id))
+    await session.commit()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    ids = []
+    url = '/todos/?limit=2'
+    while url:
+        page = client.get(url, headers=headers).json()
+        ids.extend(todo['id'] for todo in page['todos'])
+        url = page['next_cursor'] and (
+            f'/todos/?limit=2&cursor={page["next_cursor"]}'
+        )
+
+    assert ids == [1, 2, 3, 4, 5]
+
+
+def test_list_todos_invalid_cursor(client, token):
+    response = client.get(
+        '/todos/?cursor=not-a-cursor',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_list_todos_search_ranks_title_first(
+    session, client, user, token
+):
+    session.add_all([
+        TodoFactory(
+            user_id=user.id, title='Buy milk', description='groceries'
+        ),
+        TodoFactory(
+            user_id=user.id, title='Errands', description='groceries milk'
+        ),
+        TodoFactory(user_id=user.id, title='Read', description='a book'),
+    ])
+    await session.commit()
+
+    response = client.get(
+        '/todos/?q=milk',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert [todo['title'] for todo in response.json()['todos']] == [
+        'Buy milk',
+        'Errands',
+    ]
+    assert response.json()['next_cursor'] is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('dialect', ['postgresql', 'sqlite'])
+async def test_search_todos_backends(session, user, dialect):
+    session.add_all([
+        TodoFactory(user_id=user.id, title='Plan', description='trip to Rome'),
+        TodoFactory(user_id=user.id, title='Rome trip', description='pack'),
+        TodoFactory(user_id=user.id, title='Trip', description='Paris'),
+    ])
+    await session.commit()
+
+    todos = await session.scalars(
+        search_todos(select(Todo), 'rome trip', dialect)
+    )
+
+    assert [todo.title for todo in todos] == ['Rome trip', 'Plan']
+
+
+def test_list_todos_search_rejects_cursor(client, token):
+    response = client.get(
+        '/todos/?q=milk&cursor=MQ',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
 @pytest.mark.asyncio
 async def test_list_todos_filter_title_return_5_todos(
     session, client, user, token
@@ -213,20 +633,23 @@ async def test_delete_other_user_todo(
 
 
 @pytest.mark.asyncio
-async def test_patch_todo(session, client, user, token):
-    todo = TodoFactory(user_id=user.id)
+async def test_patch_todo(session, client, user, token, assert_queries):
+    # Not `done`, so the patch below is a state transition.
+    todo = TodoFactory(user_id=user.id, state=TodoState.draft)
     session.add(todo)
     await session.commit()
 
-    response = client.patch(
-        f'/todos/{todo.id}',
-        headers={'Authorization': f'Bearer {token}'},
-        json={
-            'title': 'Updated Title',
-            'description': 'Updated description.',
-            'state': 'done',
-        },
-    )
+    # principal lookup + UPDATE ... RETURNING + version bump + counts
+    with assert_queries(4):
+        response = client.patch(
+            f'/todos/{todo.id}',
+            headers={'Authorization': f'Bearer {token}'},
+            json={
+                'title': 'Updated Title',
+                'description': 'Updated description.',
+                'state': 'done',
+            },
+        )
 
     assert response.status_code == HTTPStatus.OK
     assert response.json()['title'] == 'Updated Title'
@@ -252,3 +675,396 @@ async def test_patch_todo_not_found(client, token):
 
     assert response.status_code == HTTPStatus.NOT_FOUND
     assert response.json() == {'detail': 'Task not found!'}
+
+
+@pytest.mark.asyncio
+async def test_patch_todos_bulk_by_ids(session, client, user, token):
+    todos = TodoFactory.build_batch(3, user_id=user.id, state=TodoState.todo)
+    session.add_all(todos)
+    await session.commit()
+
+    response = client.patch(
+        '/todos/',
+        headers={'Authorization': f'Bearer {token}'},
+        params={'ids': [todos[0].id, todos[2].id]},
+        json={'state': 'done'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'count': 2,
+        'ids': [todos[0].id, todos[2].id],
+    }
+
+
+@pytest.mark.asyncio
+async def test_patch_todos_bulk_by_filter_skips_other_users(
+    session, client, user, other_user, token
+):
+    expected_todos = 2
+    session.add_all(
+        TodoFactory.build_batch(2, user_id=user.id, state=TodoState.draft)
+    )
+    session.add_all(
+        TodoFactory.build_batch(
+            2, user_id=other_user.id, state=TodoState.draft
+        )
+    )
+    await session.commit()
+
+    response = client.patch(
+        '/todos/?state=draft',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'state': 'todo'},
+    )
+
+    assert response.json()['count'] == expected_todos
+
+
+def test_patch_todos_bulk_requires_selection(client, token):
+    response = client.patch(
+        '/todos/',
+        headers={'Authorization': f'Bearer {token}'},
+        json={'state': 'done'},
+    )
+
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+def test_patch_todos_bulk_requires_changes(client, token):
+    response = client.patch(
+        '/todos/?state=draft',
+        headers={'Authorization': f'Bearer {token}'},
+        json={},
+    )
+
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json() == {'detail': 'Nothing to update'}
+
+
+@pytest.mark.asyncio
+async def test_delete_todos_bulk_by_filter(session, client, user, token):
+    expected_todos = 3
+    session.add_all(
+        TodoFactory.build_batch(3, user_id=user.id, state=TodoState.trash)
+    )
+    session.add_all(
+        TodoFactory.build_batch(2, user_id=user.id, state=TodoState.done)
+    )
+    await session.commit()
+
+    response = client.delete(
+        '/todos/?state=trash',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    remaining = (await session.scalars(select(Todo.state))).all()
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['count'] == expected_todos
+    assert remaining == [TodoState.done, TodoState.done]
+
+
+def _cache_hits(route):
+    return (
+        REGISTRY.get_sample_value(
+            'response_cache_requests_total', {'route': route, 'result': 'hit'}
+        )
+        or 0
+    )
+
+
+async def _todos_version(session, user):
+    return await session.scalar(
+        select(User.todos_version).where(User.id == user.id)
+    )
+
+
+@pytest.mark.asyncio
+async def test_todo_writes_bump_todos_version(session, client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    todo = {'title': 'title', 'description': 'description', 'state': 'todo'}
+
+    todo_id = client.post('/todos/', headers=headers, json=todo).json()['id']
+    client.post('/todos/bulk', headers=headers, json=[todo, todo])
+    client.patch(f'/todos/{todo_id}', headers=headers, json={'title': 'x'})
+    client.patch(
+        '/todos/?title=title', headers=headers, json={'state': 'done'}
+    )
+    client.delete(f'/todos/{todo_id}', headers=headers)
+    client.delete('/todos/?state=done', headers=headers)
+    expected_version = 6
+
+    assert await _todos_version(session, user) == expected_version
+
+
+@pytest.mark.asyncio
+async def test_todo_misses_do_not_bump_todos_version(
+    session, client, user, token
+):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client.patch('/todos/10', headers=headers, json={'title': 'x'})
+    client.delete('/todos/10', headers=headers)
+    client.delete('/todos/?ids=10', headers=headers)
+    client.post('/todos/bulk', headers=headers, json=[])
+
+    assert await _todos_version(session, user) == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_todo_writes_do_not_lose_version_bumps(
+    session, engine, user
+):
+    writers = 20
+    token = create_access_token(data={'sub': user.email})
+    headers = {'Authorization': f'Bearer {token}'}
+
+    async def get_session_override():
+        async with AsyncSession(
+            engine, expire_on_commit=False
+        ) as request_session:
+            yield request_session
+
+    app.dependency_overrides[get_session] = get_session_override
+    try:
+        async with AsyncClient(
+            transport=ASGITransport(app), base_url='http://test'
+        ) as client:
+            responses = await asyncio.gather(
+                *(
+                    client.post(
+                        '/todos/',
+                        headers=headers,
+                        json={
+                            'title': f'todo {n}',
+                            'description': 'concurrent',
+                        },
+                    )
+                    for n in range(writers)
+                )
+            )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert all(r.status_code == HTTPStatus.OK for r in responses)
+    assert await _todos_version(session, user) == writers
+
+
+def test_todo_events_websocket_receives_changes(client, token):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    with client.websocket_connect(f'/todos/events?token={token}') as ws:
+        todo_id = client.post(
+            '/todos/',
+            headers=headers,
+            json={'title': 'title', 'description': 'description'},
+        ).json()['id']
+        client.delete(f'/todos/{todo_id}', headers=headers)
+
+        assert ws.receive_json() == {'type': 'created', 'ids': [todo_id]}
+        assert ws.receive_json() == {'type': 'deleted', 'ids': [todo_id]}
+
+
+def test_todo_events_websocket_rejects_invalid_token(client):
+    with pytest.raises(WebSocketDisconnect) as exc_info:
+        with client.websocket_connect('/todos/events?token=invalid') as ws:
+            ws.receive_json()
+
+    assert exc_info.value.code == status.WS_1008_POLICY_VIOLATION
+
+
+@pytest.mark.asyncio
+async def test_todo_events_sse_stream(user):
+    stream = todos_router._sse_stream(user.id)
+
+    assert await anext(stream) == ': connected\n\n'
+    broker.dispatch({'user_id': user.id, 'type': 'updated', 'ids': [1, 2]})
+    message = await anext(stream)
+    await stream.aclose()
+
+    assert message == (
+        'event: updated\ndata: {"type":"updated","ids":[1,2]}\n\n'
+    )
+
+
+@pytest.mark.asyncio
+async def test_todo_events_delivered_only_on_commit(session, user):
+    user_id = user.id
+
+    async with broker.subscribe(user_id) as queue:
+        await publish(session, user_id, 'created', [1])
+        await session.rollback()
+        await publish(session, user_id, 'created', [2])
+        assert queue.empty()
+        await session.commit()
+
+        assert queue.get_nowait() == {'type': 'created', 'ids': [2]}
+        assert queue.empty()
+
+
+def test_todo_broker_resyncs_slow_subscribers():
+    slow_broker = TodoBroker(queue_size=1)
+
+    async def fill():
+        async with slow_broker.subscribe(1) as queue:
+            for todo_id in range(3):
+                slow_broker.dispatch({
+                    'user_id': 1,
+                    'type': 'created',
+                    'ids': [todo_id],
+                })
+            return queue.get_nowait()
+
+    assert asyncio.run(fill()) == {'type': 'resync', 'ids': None}
+
+
+async def _wait_for_listener(session):
+    """Wait until the broker's connection has run LISTEN."""
+    listening = (
+        select(func.count())
+        .where(text("query = 'LISTEN todo_events'"))
+        .select_from(text('pg_stat_activity'))
+    )
+    async with asyncio.timeout(5):
+        while not await session.scalar(listening):
+            await session.commit()
+            await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_todo_events_over_postgres_notify(
+    session, engine, user, monkeypatch
+):
+    monkeypatch.setattr(events.settings, 'EVENTS_BACKEND', 'postgres')
+    monkeypatch.setattr(
+        events.settings,
+        'DATABASE_URL',
+        engine.url.render_as_string(hide_password=False),
+    )
+    pg_broker = TodoBroker(queue_size=10)
+    monkeypatch.setattr(events, 'broker', pg_broker)
+
+    async with pg_broker.subscribe(user.id) as queue:
+        await _wait_for_listener(session)
+        await publish(session, user.id, 'updated', [7])
+        await session.commit()
+
+        received = await asyncio.wait_for(queue.get(), timeout=5)
+
+    await pg_broker.close()
+    assert received == {'type': 'updated', 'ids': [7]}
+
+
+@pytest.mark.asyncio
+async def test_todo_events_listener_reconnects_and_resyncs(
+    session, engine, user, monkeypatch
+):
+    monkeypatch.setattr(events.settings, 'EVENTS_BACKEND', 'postgres')
+    monkeypatch.setattr(
+        events.settings,
+        'DATABASE_URL',
+        engine.url.render_as_string(hide_password=False),
+    )
+    monkeypatch.setattr(events, 'LISTEN_RETRY_SECONDS', 0.01)
+    pg_broker = TodoBroker(queue_size=10)
+    monkeypatch.setattr(events, 'broker', pg_broker)
+
+    async with pg_broker.subscribe(user.id) as queue:
+        await _wait_for_listener(session)
+        await session.execute(
+            select(func.pg_terminate_backend(text('pid')))
+            .where(text("query = 'LISTEN todo_events'"))
+            .select_from(text('pg_stat_activity'))
+        )
+        await session.commit()
+
+        resync = await asyncio.wait_for(queue.get(), timeout=5)
+        await publish(session, user.id, 'updated', [7])
+        await session.commit()
+        received = await asyncio.wait_for(queue.get(), timeout=5)
+
+    await pg_broker.close()
+    assert resync == {'type': 'resync', 'ids': None}
+    assert received == {'type': 'updated', 'ids': [7]}
+
+
+async def _actual_counts(session, user):
+    return dict(
+        (
+            await session.execute(
+                select(Todo.state, func.count())
+                .where(Todo.user_id == user.id)
+                .group_by(Todo.state)
+            )
+        ).all()
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('session', ['postgresql', 'sqlite'], indirect=True)
+async def test_todo_stats_follow_writes(session, client, user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+    todo = {'title': 'title', 'description': 'description', 'state': 'todo'}
+    draft = {**todo, 'state': 'draft'}
+
+    ids = [
+        client.post('/todos/', headers=headers, json=todo).json()['id']
+        for _ in range(3)
+    ]
+    client.post('/todos/bulk', headers=headers, json=[draft, draft])
+    client.patch(f'/todos/{ids[0]}', headers=headers, json={'state': 'done'})
+    client.patch(f'/todos/{ids[1]}', headers=headers, json={'title': 'x'})
+    client.patch(
+        '/todos/?state=draft', headers=headers, json={'state': 'doing'}
+    )
+    client.delete(f'/todos/{ids[1]}', headers=headers)
+    client.delete(f'/todos/?ids={ids[2]}', headers=headers)
+
+    response = client.get('/todos/stats', headers=headers)
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {
+        'total': 3,
+        'states': {'draft': 0, 'todo': 0, 'doing': 2, 'done': 1, 'trash': 0},
+    }
+    assert response.json()['states'] == {
+        state.value: (await _actual_counts(session, user)).get(state, 0)
+        for state in TodoState
+    }
+
+
+@pytest.mark.asyncio
+async def test_todo_stats_read_counters_only(
+    session, client, user, token, assert_queries
+):
+    session.add_all(TodoFactory.build_batch(5, user_id=user.id))
+    await session.commit()
+
+    # principal lookup + counters
+    with assert_queries(2):
+        response = client.get(
+            '/todos/stats', headers={'Authorization': f'Bearer {token}'}
+        )
+
+    assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.asyncio
+async def test_repair_todo_counts_fixes_drift(session, engine, user):
+    # Inserted behind the handlers' back, so the counters miss them.
+    session.add_all(
+        TodoFactory.build_batch(3, user_id=user.id, state=TodoState.done)
+    )
+    session.add_all(
+        TodoFactory.build_batch(1, user_id=user.id, state=TodoState.trash)
+    )
+    await session.commit()
+    drifted_states = 2
+
+    assert await repair_all_todo_counts(engine) == drifted_states
+    assert await repair_all_todo_counts(engine) == 0
+    assert {
+        state: count
+        for state, count in (await todo_counts(session, user.id)).items()
+        if count
+    } == await _actual_counts(session, user)
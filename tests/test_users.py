@@ -1,18 +1,26 @@
 from http import HTTPStatus
 
+import pytest
+from sqlalchemy import func, select
+
+from fastapi_zero.models import Todo
+from fastapi_zero.routers import users as users_router
 from fastapi_zero.schemas import UserPublic
 from fastapi_zero.security import create_access_token
-
-
-def test_create_user(client):
-    response = client.post(
-        '/users/',
-        json={
-            'username': 'alice',
-            'email': 'alice@example.com',
-            'password': 'secret',
-        },
-    )
+from tests.test_todos import TodoFactory
+
+
+def test_create_user(client, assert_queries):
+    # duplicate check + INSERT ... RETURNING
+    with assert_queries(2):
+        response = client.post(
+            '/users/',
+            json={
+                'username': 'alice',
+                'email': 'alice@example.com',
+                'password': 'secret',
+            },
+        )
     assert response.status_code == HTTPStatus.CREATED
     assert response.json() == {
         'username': 'alice',
@@ -56,7 +64,42 @@ def test_read_users(client, user, token):
     )
 
     assert response.status_code == HTTPStatus.OK
-    assert response.json() == {'users': [user_schema]}
+    assert response.json() == {'users': [user_schema], 'next_cursor': None}
+
+
+def test_read_users_fast_json_matches_default(
+    client, user, token, monkeypatch
+):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    default = client.get('/users/', headers=headers).json()
+    monkeypatch.setattr(users_router.settings, 'FAST_JSON_RESPONSES', True)
+    fast = client.get('/users/', headers=headers).json()
+
+    assert fast == default
+
+
+def test_read_users_does_not_select_passwords(client, token, count_queries):
+    with count_queries() as statements:
+        response = client.get(
+            '/users/', headers={'Authorization': f'Bearer {token}'}
+        )
+
+    assert response.status_code == HTTPStatus.OK
+    assert 'users.password' not in statements[-1]
+
+
+def test_read_users_with_cursor(client, user, other_user, token):
+    headers = {'Authorization': f'Bearer {token}'}
+
+    first_page = client.get('/users/?limit=1', headers=headers).json()
+    second_page = client.get(
+        f'/users/?limit=1&cursor={first_page["next_cursor"]}',
+        headers=headers,
+    ).json()
+
+    assert [u['id'] for u in first_page['users']] == [user.id]
+    assert [u['id'] for u in second_page['users']] == [other_user.id]
 
 
 def test_read_user(client, user):
@@ -79,17 +122,74 @@ def test_read_user_not_found(client):
     assert response.json() == {'detail': 'User not found!'}
 
 
-def test_update_user(client, user, token):
-    response = client.put(
-        '/users/1',
+def test_read_user_not_modified(client, user):
+    etag = client.get('/users/1').headers['ETag']
+
+    response = client.get('/users/1', headers={'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert not response.content
+
+
+def test_read_user_etag_changes_after_update(client, user, token):
+    etag = client.get('/users/1').headers['ETag']
+    client.put(
+        f'/users/{user.id}',
         headers={'Authorization': f'Bearer {token}'},
         json={
             'username': 'bob',
-            'email': 'test@test.com',
-            'password': 'secret',
+            'email': 'bob@example.com',
+            'password': 'mynewpassword',
         },
     )
 
+    response = client.get('/users/1', headers={'If-None-Match': etag})
+
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['username'] == 'bob'
+
+
+@pytest.mark.usefixtures('cache_backend')
+def test_read_user_served_from_response_cache(client, user, count_queries):
+    first = client.get(f'/users/{user.id}')
+    with count_queries() as statements:
+        second = client.get(f'/users/{user.id}')
+
+    assert second.json() == first.json()
+    assert statements == []
+
+
+@pytest.mark.usefixtures('cache_backend')
+def test_update_user_invalidates_response_cache(client, user, token):
+    client.get(f'/users/{user.id}')
+    client.put(
+        f'/users/{user.id}',
+        headers={'Authorization': f'Bearer {token}'},
+        json={
+            'username': 'bob',
+            'email': 'bob@example.com',
+            'password': 'mynewpassword',
+        },
+    )
+
+    response = client.get(f'/users/{user.id}')
+
+    assert response.json()['username'] == 'bob'
+
+
+def test_update_user(client, user, token, assert_queries):
+    # principal lookup + UPDATE ... RETURNING
+    with assert_queries(2):
+        response = client.put(
+            '/users/1',
+            headers={'Authorization': f'Bearer {token}'},
+            json={
+                'username': 'bob',
+                'email': 'test@test.com',
+                'password': 'secret',
+            },
+        )
+
     assert response.status_code == HTTPStatus.OK
     assert response.json() == {
         'username': 'bob',
@@ -130,6 +230,25 @@ def test_update_integrity_error(client, user, other_user, token):
     }
 
 
+@pytest.mark.asyncio
+async def test_update_user_deleted_behind_cached_principal(
+    session, client, user, token
+):
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/auth/refresh_token', headers=headers)
+    # deleted by another worker while this one still caches the principal
+    await session.delete(user)
+    await session.commit()
+
+    response = client.put(
+        f'/users/{user.id}',
+        headers=headers,
+        json={'username': 'bob', 'email': user.email, 'password': 'secret'},
+    )
+
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
 def test_delete_user(client, user, token):
     response = client.delete(
         f'/users/{user.id}',
@@ -140,6 +259,20 @@ def test_delete_user(client, user, token):
     assert response.json() == {'message': 'User deleted'}
 
 
+@pytest.mark.asyncio
+async def test_delete_user_with_todos(session, client, user, token):
+    session.add_all(TodoFactory.build_batch(5, user_id=user.id))
+    await session.commit()
+
+    response = client.delete(
+        f'/users/{user.id}',
+        headers={'Authorization': f'Bearer {token}'},
+    )
+
+    assert response.status_code == HTTPStatus.OK
+    assert await session.scalar(select(func.count()).select_from(Todo)) == 0
+
+
 def test_delete_user_with_wrong_user(client, other_user, token):
     response = client.delete(
         f'/users/{other_user.id}',